@@ -0,0 +1,193 @@
+import os
+import sqlite3
+from functools import lru_cache
+
+from PIL import ImageDraw, ImageFont
+
+from nutrition import base_food_name, normalize_food_name
+
+# -------------------------------------------------
+# ALLERGEN TAXONOMY
+# -------------------------------------------------
+# Canonical allergens; the position is the bit used in allergen masks
+ALLERGENS = [
+    "dairy", "gluten", "sugar", "tomato", "nuts", "peanuts",
+    "egg", "soy", "fish", "shellfish", "sesame",
+]
+ALLERGEN_BITS = {name: 1 << i for i, name in enumerate(ALLERGENS)}
+
+# What users type -> canonical allergen
+ALLERGEN_SYNONYMS = {
+    "milk": "dairy", "cheese": "dairy", "lactose": "dairy", "butter": "dairy",
+    "cream": "dairy", "yogurt": "dairy", "yoghurt": "dairy", "whey": "dairy", "casein": "dairy",
+    "wheat": "gluten", "barley": "gluten", "rye": "gluten", "spelt": "gluten", "celiac": "gluten",
+    "sucrose": "sugar", "fructose": "sugar", "glucose": "sugar",
+    "tomatoes": "tomato",
+    "nut": "nuts", "tree nut": "nuts", "tree nuts": "nuts", "almond": "nuts", "almonds": "nuts",
+    "walnut": "nuts", "walnuts": "nuts", "cashew": "nuts", "cashews": "nuts", "hazelnut": "nuts",
+    "peanut": "peanuts", "peanut butter": "peanuts", "groundnut": "peanuts", "groundnuts": "peanuts",
+    "eggs": "egg",
+    "soya": "soy", "soybean": "soy", "soybeans": "soy",
+    "salmon": "fish", "tuna": "fish", "cod": "fish",
+    "shrimp": "shellfish", "prawn": "shellfish", "prawns": "shellfish", "crab": "shellfish", "lobster": "shellfish",
+    "sesame seeds": "sesame",
+}
+
+# Seed data for the dish_allergens table: the model classes, then the
+# food_data rows a result can be corrected to
+dish_ingredients = {
+    'Apple': ['sugar'],
+    'Pizza': ['dairy', 'gluten', 'tomato'],
+    'Avocado': [],
+    'Milk': ['dairy'],
+    'Burger': ['gluten', 'dairy', 'sugar'],
+    'Bread': ['gluten', 'sugar'],
+    'Banana': ['sugar'],
+    'Rice': [],
+    'Pasta Alfredo': ['dairy', 'gluten'],
+    'Pizza Slice': ['dairy', 'gluten', 'tomato'],
+    'Chapati': ['gluten'],
+    'Paneer Curry': ['dairy', 'tomato', 'nuts'],
+}
+
+def canonical_allergen(term):
+    term = " ".join(str(term).strip().lower().split())
+    return ALLERGEN_SYNONYMS.get(term, term)
+
+def mask_of(allergens):
+    mask = 0
+    for a in allergens:
+        mask |= ALLERGEN_BITS.get(canonical_allergen(a), 0)
+    return mask
+
+def names_of(mask):
+    return [name for name in ALLERGENS if mask & ALLERGEN_BITS[name]]
+
+@lru_cache(maxsize=4096)
+def parse_allergies(text):
+    """Comma-separated user allergies -> allergen bitmask (cached per string).
+    Terms outside the taxonomy add no bit; see unrecognized_allergies."""
+    if not text:
+        return 0
+    return mask_of(x for x in str(text).split(",") if x.strip())
+
+def unrecognized_allergies(text):
+    """The terms of a comma-separated allergy list that no dish is screened for."""
+    if not text:
+        return []
+    return [x.strip() for x in str(text).split(",") if x.strip() and canonical_allergen(x) not in ALLERGEN_BITS]
+
+# -------------------------------------------------
+# ALLERGEN INDEX
+# -------------------------------------------------
+class AllergenIndex:
+    """dish -> allergen mask, plus the inverted allergen -> dishes index.
+    Dish names are matched like food_data names (case, spacing, and
+    "Rice (cooked)" -> "Rice"), later entries winning."""
+
+    def __init__(self, dish_masks):
+        by_key = {normalize_food_name(dish): (dish, mask) for dish, mask in dict(dish_masks).items()}
+        self.dish_masks = dict(by_key.values())
+        self._masks = {key: mask for key, (_, mask) in by_key.items()}
+        self.all_dishes = frozenset(self.dish_masks)
+        self.dishes_with = {
+            name: frozenset(d for d, m in self.dish_masks.items() if m & bit)
+            for name, bit in ALLERGEN_BITS.items()
+        }
+
+    @classmethod
+    def from_ingredients(cls, ingredients=None):
+        ingredients = dish_ingredients if ingredients is None else ingredients
+        return cls({dish: mask_of(items) for dish, items in ingredients.items()})
+
+    def mask(self, dish_name):
+        """Allergen mask of ``dish_name``; None when there is no data for it."""
+        key = normalize_food_name(dish_name)
+        return self._masks.get(key, self._masks.get(base_food_name(key)))
+
+    def knows(self, dish_name):
+        return self.mask(dish_name) is not None
+
+    def allergens_in(self, dish_name, user_mask):
+        return names_of((self.mask(dish_name) or 0) & user_mask)
+
+    def safe_dishes(self, user_mask):
+        unsafe = set()
+        for name in names_of(user_mask):
+            unsafe |= self.dishes_with[name]
+        return sorted(self.all_dishes - unsafe)
+
+    def screen(self, dishes, user_mask):
+        """Check a whole menu at once: {dish: [allergens found]}."""
+        return {d: self.allergens_in(d, user_mask) for d in dishes}
+
+# -------------------------------------------------
+# DATABASE (food_calories.db)
+# -------------------------------------------------
+ALLERGEN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS allergens (
+    bit INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS dish_allergens (
+    dish TEXT PRIMARY KEY,
+    allergen_mask INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+def ensure_allergen_tables(db_path):
+    """Create the allergen tables and seed them from dish_ingredients
+    (create_db.py; the app itself only reads them)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(ALLERGEN_SCHEMA)
+        conn.executemany(
+            "INSERT OR IGNORE INTO allergens (bit, name) VALUES (?, ?)",
+            list(enumerate(ALLERGENS)),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO dish_allergens (dish, allergen_mask) VALUES (?, ?)",
+            [(dish, mask_of(items)) for dish, items in dish_ingredients.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def load_allergen_index(db_path):
+    """The built-in dish_ingredients overlaid with dish_allergens from
+    ``db_path``, when it has the table. Opens the database read-only."""
+    if not os.path.exists(db_path):
+        return AllergenIndex.from_ingredients()
+    uri = "file:" + os.path.abspath(db_path) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        rows = conn.execute("SELECT dish, allergen_mask FROM dish_allergens").fetchall()
+    except sqlite3.OperationalError:
+        return AllergenIndex.from_ingredients()
+    finally:
+        conn.close()
+    return AllergenIndex(list(AllergenIndex.from_ingredients().dish_masks.items()) + rows)
+
+_default_index = AllergenIndex.from_ingredients()
+
+# -------------------------------------------------
+# ALLERGY CHECK
+# -------------------------------------------------
+def check_allergies(dish_name, user_allergies_list, index=None):
+    # Accepts the raw comma-separated string or a mask from parse_allergies()
+    if not user_allergies_list:
+        return []
+    mask = user_allergies_list if isinstance(user_allergies_list, int) else parse_allergies(user_allergies_list)
+    return (index or _default_index).allergens_in(dish_name, mask)
+
+def overlay_allergy_alert(pil_img, allergy_list):
+    if not allergy_list:
+        return pil_img
+    draw = ImageDraw.Draw(pil_img)
+    try:
+        font = ImageFont.truetype("arial.ttf", 20)
+    except:
+        font = ImageFont.load_default()
+    text = "⚠ Allergy: " + ", ".join(allergy_list)
+    draw.text((10, 10), text, fill="red", font=font)
+    return pil_img
@@ -1,18 +1,27 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
 import os
-import io
-import json
 import uuid
 import datetime
-import random
-import numpy as np
 import base64
 import pandas as pd
-from tensorflow.keras.models import load_model
+import food_model
+from prediction_cache import PredictionCache
+from nutrition import NutritionIndex, NUTRITION_DB
+from history_store import HistoryStore, HISTORY_DB
+from user_store import UserStore, USER_DB
+from assets import ASSET_SOURCES, build_assets, static_url
+from preprocessing import open_image
+from image_store import ImageStore, HISTORY_IMG_DIR
+from allergies import (check_allergies, load_allergen_index, names_of, overlay_allergy_alert, parse_allergies,
+                       unrecognized_allergies)
+from metrics import REGISTRY as METRICS, start_metrics_server, timed
+from plate import PlateAnalyzer
+from embedding_store import EmbeddingStore, EMBEDDING_DIR
+from model_registry import ModelRegistry, MODEL_VERSIONS_DIR, KERAS_FILE
+from food_search import FoodSearch
 
 # -------------------------------------------------
-# CONFIG - HIDE ALL WARNINGS AND ERRORS
+# CONFIG
 # -------------------------------------------------
 st.set_page_config(page_title="🍽 Food Calorie Estimator", layout="wide")
 
@@ -21,15 +30,28 @@ st.set_page_config(page_title="🍽 Food Calorie Estimator", layout="wide")
 # -------------------------------------------------
 # BACKGROUND IMAGE
 # -------------------------------------------------
-def set_bg_local(image_file):
-    with open(image_file, "rb") as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    st.markdown(
-        f"""
+def background_image_css(image_file):
+    variants = build_assets({image_file: ASSET_SOURCES.get(image_file, 1920)})[image_file]
+    if st.get_option("server.enableStaticServing"):
+        css = f'background-image: url("{static_url(variants["jpg"])}");'
+        if "webp" in variants:
+            css += (f' background-image: image-set(url("{static_url(variants["webp"])}") type("image/webp"),'
+                    f' url("{static_url(variants["jpg"])}") type("image/jpeg"));')
+        return css
+    # Static serving off: inline the smallest resized variant instead of the original
+    path = min(variants.values(), key=os.path.getsize)
+    mime = "image/webp" if path.endswith(".webp") else "image/jpeg"
+    with open(path, "rb") as f:
+        b64 = base64.b64encode(f.read()).decode()
+    return f'background-image: url("data:{mime};base64,{b64}");'
+
+@st.cache_resource
+def build_page_css(image_file):
+    # Built once per process; every rerun just re-sends this small string
+    return f"""
         <style>
         [data-testid="stAppViewContainer"] {{
-            background-image: url("data:image/jpg;base64,{b64}");
+            {background_image_css(image_file)}
             background-size: cover;
             background-position: center;
             background-attachment: fixed;
@@ -54,10 +76,8 @@ def set_bg_local(image_file):
             margin-bottom: 10px;
             text-shadow: 2px 2px 4px rgba(255,255,255,0.8);
         }}
-        /* Hide all Streamlit warnings and errors */
-        .stAlert {{
-            display: none !important;
-        }}
+        /* Hide exception tracebacks; st.warning/st.error alerts stay visible,
+           the allergy and nutrition warnings are among them */
         .stException {{
             display: none !important;
         }}
@@ -76,40 +96,29 @@ def set_bg_local(image_file):
             padding-top: 0px;
         }}
         </style>
-        """,
-        unsafe_allow_html=True
-    )
+        """
+
+def set_bg_local(image_file):
+    st.markdown(build_page_css(image_file), unsafe_allow_html=True)
 
 set_bg_local("background.jpg")
 
 # -------------------------------------------------
 # USER DATABASE AUTH
 # -------------------------------------------------
-USER_DB = "users.json"
+@st.cache_resource
+def get_user_store():
+    return UserStore(USER_DB)
 
-def load_users():
-    if not os.path.exists(USER_DB):
-        with open(USER_DB, "w") as f:
-            json.dump([], f)
-    with open(USER_DB, "r") as f:
-        return json.load(f)
+user_store = get_user_store()
 
-def save_users(users):
-    with open(USER_DB, "w") as f:
-        json.dump(users, f, indent=2)
+def load_users():
+    return user_store.all()
 
 def find_user(email):
-    users = load_users()
-    for u in users:
-        if u["email"].lower() == email.lower():
-            return u
-    return None
+    return user_store.find(email)
 
 def register_user(name, age, gender, allergies, medications, email, password):
-    users = load_users()
-    if find_user(email):
-        return False, "Email already exists!"
-
     user = {
         "name": name,
         "age": age,
@@ -119,8 +128,8 @@ def register_user(name, age, gender, allergies, medications, email, password):
         "email": email,
         "password": password
     }
-    users.append(user)
-    save_users(users)
+    if not user_store.add(user):
+        return False, "Email already exists!"
     return True, "Account created successfully!"
 
 def authenticate(email, password):
@@ -130,13 +139,7 @@ def authenticate(email, password):
     return False, None
 
 def reset_password(email, new_pass):
-    users = load_users()
-    for u in users:
-        if u["email"].lower() == email.lower():
-            u["password"] = new_pass
-            save_users(users)
-            return True
-    return False
+    return user_store.update(email, password=new_pass)
 
 # AUTH STATES
 if "auth_page" not in st.session_state:
@@ -174,6 +177,9 @@ if st.session_state.user is None and st.session_state.auth_page == "login":
                     ok, user = authenticate(email, password)
                     if ok:
                         st.session_state.user = user
+                        # Parsed once per login; checks are then a bitmask AND
+                        st.session_state.allergy_mask = parse_allergies(user.get("allergies", ""))
+                        st.session_state.unchecked_allergies = unrecognized_allergies(user.get("allergies", ""))
                         st.success("Login successful!")
                         st.experimental_rerun()
                     else:
@@ -219,6 +225,8 @@ if st.session_state.user is None and st.session_state.auth_page == "register":
                 gender = st.selectbox("Gender", ["Female", "Male", "Other"], key="reg_gender")
             
             allergies = st.text_input("Allergies", placeholder="Comma separated (e.g., nuts, dairy)", key="reg_allergies")
+            if unrecognized_allergies(allergies):
+                st.warning(f"Not in the allergen list, so dishes won't be checked for: {', '.join(unrecognized_allergies(allergies))}")
             medications = st.text_input("Medications", placeholder="Current medications (optional)", key="reg_meds")
             
             password = st.text_input("Password", type="password", placeholder="Create password", key="reg_pass")
@@ -286,43 +294,47 @@ if st.session_state.user is None and st.session_state.auth_page == "forgot":
 # -------------------------------------------------
 # STORAGE SETUP
 # -------------------------------------------------
-HISTORY_FILE = "history.json"
-HISTORY_IMG_DIR = "history_images"
+HISTORY_FILE = "history.json"  # legacy store, migrated into HISTORY_DB on first run
+HISTORY_PAGE_SIZE = 20
+DAILY_CALORIE_GOAL = 2000
+
+@st.cache_resource
+def get_history_store():
+    store = HistoryStore(HISTORY_DB)
+    # Legacy entries only carry the user's name
+    emails = {u["name"]: u["email"] for u in load_users()}
+    store.migrate_json(HISTORY_FILE, lambda e: e.get("user_email") or emails.get(e.get("user"), e.get("user")))
+    return store
+
+history_store = get_history_store()
+
+@st.cache_resource
+def get_image_store():
+    return ImageStore(HISTORY_IMG_DIR)
+
+image_store = get_image_store()
 
 def init_storage():
     os.makedirs(HISTORY_IMG_DIR, exist_ok=True)
-    if not os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "w") as f:
-            json.dump([], f)
-
-def load_history():
-    try:
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return []
+
+def current_user_key():
+    return st.session_state.user["email"]
+
+def load_history(limit=HISTORY_PAGE_SIZE, offset=0):
+    return history_store.page(current_user_key(), limit, offset)
 
 def save_history(entry):
-    hist = load_history()
-    hist.insert(0, entry)
-    hist = hist[:50]
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(hist, f, indent=2, default=str)
+    evicted = history_store.append(entry, entry.get("user_email") or current_user_key())
+    for h in evicted:
+        image_store.release_entry(h)
 
 def clear_history():
-    for fname in os.listdir(HISTORY_IMG_DIR):
-        try:
-            os.remove(os.path.join(HISTORY_IMG_DIR, fname))
-        except:
-            pass
-    with open(HISTORY_FILE, "w") as f:
-        json.dump([], f)
+    for h in history_store.clear(current_user_key()):
+        image_store.release_entry(h)
 
 def save_image_file(pil_img):
-    fname = f"{uuid.uuid4().hex}.png"
-    path = os.path.join(HISTORY_IMG_DIR, fname)
-    pil_img.save(path)
-    return path
+    # Returns img_hash/img_path/thumb_path; the JPEGs are written in the background
+    return image_store.put(pil_img)
 
 # -------------------------------------------------
 # HEALTH TIPS
@@ -340,85 +352,253 @@ FOOD_HEALTH_TIPS = {
 # CNN MODEL LOADING
 # -------------------------------------------------
 @st.cache_resource
-def load_cnn_model():
-    try:
-        model = load_model("models/custom_food_model.h5")
-        return model
-    except Exception:
-        # Return a dummy model if real model not found
-        return None
+def get_model_registry():
+    # Loads and warms up in the background (started right after login), then
+    # swaps in each new models/versions/ folder that train_model.py publishes.
+    registry = ModelRegistry().start()
+    # Registered with the registry, so the /metrics thread never starts one
+    METRICS.register_gauge("cascade_tiny_hit_ratio", lambda: cascade_hit_rate(registry))
+    return registry
 
-cnn_model = load_cnn_model()
+def get_model_version():
+    return get_model_registry().current()
+
+# Cascade: the tiny 96px model (train_model.py --cascade) answers easy images
+CASCADE_ENABLED = os.environ.get("FOOD_CASCADE", "1") != "0"
+
+def get_tiny_model(version):
+    return version.tiny if CASCADE_ENABLED and version is not None else None
+
+def cascade_hit_rate(registry):
+    tiny = get_tiny_model(registry.current(timeout=0))
+    return tiny.hit_rate() if tiny is not None else 0.0
+
+# -------------------------------------------------
+# PREDICTION CACHE
+# -------------------------------------------------
+PREDICTION_CACHE_DB = "cache/predictions.db"
+PREDICTION_CACHE_SIZE = 512
+PREDICTION_CACHE_PERCEPTUAL = False  # also match near-identical re-uploads
+
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(
+        max_entries=PREDICTION_CACHE_SIZE,
+        disk_path=PREDICTION_CACHE_DB,
+        perceptual=PREDICTION_CACHE_PERCEPTUAL,
+    )
+
+prediction_cache = get_prediction_cache()
+METRICS.register_counter("prediction_cache_hits", lambda: prediction_cache.hits)
+METRICS.register_counter("prediction_cache_misses", lambda: prediction_cache.misses)
+METRICS.register_gauge("prediction_cache_hit_ratio", prediction_cache.hit_rate)
+
+# -------------------------------------------------
+# NUTRITION LOOKUP
+# -------------------------------------------------
+@st.cache_resource
+def get_nutrition_index():
+    return NutritionIndex(NUTRITION_DB)
+
+nutrition_index = get_nutrition_index()
+
+@st.cache_resource
+def get_allergen_index():
+    return load_allergen_index(NUTRITION_DB)
+
+allergen_index = get_allergen_index()
+
+# -------------------------------------------------
+# EMBEDDING STORE (similar meals / kNN fallback)
+# -------------------------------------------------
+@st.cache_resource
+def get_embedding_store():
+    return EmbeddingStore(EMBEDDING_DIR)
+
+embedding_store = get_embedding_store()
+METRICS.register_gauge("embedding_store_items", lambda: embedding_store.count)
+
+def similar_meals(result, k=3):
+    # Rows come from run_model; cached results may predate a wiped store
+    row = result.get("embedding_row")
+    if row is None or row >= embedding_store.count:
+        return []
+    hits = embedding_store.search(embedding_store.matrix[row], k + 1, space=embedding_store.spaces[row])
+    return [(label, sim) for label, sim, r in hits if r != row][:k]
+
+# -------------------------------------------------
+# FOOD SEARCH / DISH CORRECTION
+# -------------------------------------------------
+@st.cache_resource
+def get_food_search():
+    return FoodSearch(NUTRITION_DB)
+
+food_search = get_food_search()
+
+def food_label(match):
+    label = f"{match['name']} — {match['calories']:.0f} kcal"
+    return label + (f" / {match['serving_size']}" if match["serving_size"] else "")
+
+def apply_correction(last, dish):
+    """Re-score the last analysis as ``dish``; updates the saved history entry
+    and the cached prediction, and teaches the embedding store the corrected label."""
+    entry = last["entry"]
+    base = food_model.estimate_nutrition(dish, 100.0, nutrition_index)
+    corrected = dict(
+        entry,
+        dish=dish,
+        confidence=100.0,
+        corrected_from=entry.get("corrected_from", entry["dish"]),
+        **dict(zip(food_model.NUTRIENT_FIELDS,
+                   food_model.scale_nutrition(base, entry.get("portion_pct", 100) / 100.0))),
+        allergy_detected=check_allergies(dish, st.session_state.allergy_mask, allergen_index),
+    )
+    if last.get("saved"):
+        history_store.update(corrected, current_user_key())
+    row = last.get("embedding_row")
+    if row is not None and row < embedding_store.count:
+        row = embedding_store.add(embedding_store.matrix[row], [dish], sources=[entry.get("img_path")], verified=True,
+                                  space=embedding_store.spaces[row])[0]
+    if last.get("cache_key"):
+        # The same photo again now gets the corrected dish
+        prediction_cache.store(last["cache_key"],
+                               {"dish": dish, "confidence": 100.0, "classifier": "user", "embedding_row": row})
+    last["entry"] = corrected
+    last["embedding_row"] = row
+
+def correct_dish(page_key):
+    # Lives outside the Analyze button block so it survives widget reruns
+    last = st.session_state.get("last_result")
+    if not last or last["page"] != page_key:
+        return
+    entry = last["entry"]
+    with st.expander(f"✏️ Not {entry['dish']}? Correct the dish"):
+        query = st.text_input("Search foods", key=f"{page_key}_dish_query")
+        matches = food_search.suggest(query) if query else []
+        if query and not matches:
+            st.caption("No matching foods.")
+        if matches:
+            choice = st.selectbox("Matches", matches, format_func=food_label, key=f"{page_key}_dish_choice")
+            if st.button("Use this dish", key=f"{page_key}_dish_apply"):
+                apply_correction(last, choice["name"])
+                entry = last["entry"]
+                st.success(f"Updated to {entry['dish']}: {amount(entry['calories'], 'kcal')}"
+                           + (" (history updated)" if last.get("saved") else ""))
+                if entry["allergy_detected"]:
+                    st.error(f"⚠ Allergy Detected: {', '.join(entry['allergy_detected'])}")
+                warn_unchecked_allergies([entry["dish"]])
+                warn_unknown_nutrition([entry])
+
+# Camera/upload photos are decoded (JPEG draft mode) near this size, not at full sensor resolution
+DISPLAY_MAX_SIDE = 1024
+
+# Set to share one model across app workers via inference_server.py
+INFERENCE_URL = os.environ.get("FOOD_INFERENCE_URL")
+
+def run_model(pil_img, version=None):
+    # Only runs on a prediction-cache miss. The cache keeps just the dish and
+    # confidence; nutrition is looked up afterwards (see predict_food)
+    with timed("inference"):
+        if INFERENCE_URL:
+            return food_model.prediction_only(food_model.predict_food_remote(INFERENCE_URL, pil_img))
+        version = version or get_model_version()
+        return food_model.prediction_only(food_model.predict_food(
+            version.model, pil_img, embeddings=embedding_store, remember=True,
+            tiny=get_tiny_model(version), classes=version.classes))
+
+def predict_food_batch(pil_imgs):
+    if INFERENCE_URL:
+        return [run_model(img) for img in pil_imgs]
+    version = get_model_version()
+    return food_model.predict_food_batch(version.model, pil_imgs, nutrition=nutrition_index,
+                                         embeddings=embedding_store, remember=True,
+                                         tiny=get_tiny_model(version), classes=version.classes)
+
+@st.cache_data(ttl=10)
+def remote_model_identity():
+    # Asked every few seconds, not per image: a restarted server's new
+    # model is noticed within that
+    return food_model.remote_model_identity(INFERENCE_URL)
+
+def cache_namespace(version):
+    # Cached answers are per model: another version, a model file replaced
+    # in place or a retrained inference server misses and predicts afresh
+    if INFERENCE_URL:
+        return f"{INFERENCE_URL}#{remote_model_identity()}"
+    return version.identity
 
 def predict_food(pil_img):
-    if cnn_model is None:
-        # Mock prediction if model not loaded
-        classes = ["Apple", "Burger", "Avocado", "Bread", "Milk", "Pizza"]
-        name = random.choice(classes)
-        confidence = random.uniform(85, 98)
-    else:
-        img = pil_img.resize((224,224))
-        x = np.array(img)
-        x = np.expand_dims(x, axis=0)
-        x = x / 255.0
-
-        preds = cnn_model.predict(x)
-        classes = ["Apple", "Burger", "Avocado", "Bread", "Milk", "Pizza"]
-        pred_class = np.argmax(preds)
-        confidence = float(np.max(preds)) * 100
-        name = classes[pred_class]
-
-    base_cal = random.randint(220, 650)
-    carb_pct, protein_pct, fat_pct = 0.50, 0.20, 0.30
-    carbs_g = int((base_cal * carb_pct) / 4)
-    protein_g = int((base_cal * protein_pct) / 4)
-    fat_g = int((base_cal * fat_pct) / 9)
-
-    return {
-        "dish": name,
-        "confidence": confidence,
-        "calories": base_cal,
-        "carbs_g": carbs_g,
-        "protein_g": protein_g,
-        "fat_g": fat_g,
-    }
+    # One version for the whole request, even if a newer one goes live meanwhile
+    version = None if INFERENCE_URL else get_model_version()
+    key = prediction_cache.key(pil_img, cache_namespace(version))
+    prediction = prediction_cache.lookup(key)
+    if prediction is None:
+        prediction = run_model(pil_img, version)
+        prediction_cache.store(key, prediction)
+    # Fresh nutrition on every call, so food_calories.db edits apply to cached
+    # dishes too; cache_key lets a correction replace the cached answer
+    return dict(food_model.with_nutrition(prediction, nutrition_index), cache_key=key)
+
+@st.cache_resource(max_entries=1)
+def get_plate_analyzer(version_name, _version):
+    # Needs the in-process Keras graph (for the spatial feature map), even
+    # when FOOD_INFERENCE_URL or the TFLite backend is used for single dishes
+    if food_model.MODEL_BACKEND == "tflite":
+        keras_path = os.path.join(MODEL_VERSIONS_DIR, version_name, KERAS_FILE) if version_name else food_model.KERAS_MODEL_PATH
+        return PlateAnalyzer(food_model.load_and_warm_up(keras_path), _version.classes)
+    return PlateAnalyzer(_version.model, _version.classes)
+
+def analyze_plate(pil_img):
+    with timed("inference_plate"):
+        version = get_model_version()
+        return get_plate_analyzer(version.name, version).analyze(pil_img, nutrition=nutrition_index)
 
 # -------------------------------------------------
-# ALLERGY CHECK
+# DIAGNOSTICS
 # -------------------------------------------------
-dish_ingredients = {
-    'Apple': ['sugar'],
-    'Pizza': ['dairy', 'gluten', 'tomato'],
-    'Avocado': [],
-    'Milk': ['dairy'],
-    'Burger': ['gluten', 'dairy', 'sugar'],
-    'Bread': ['gluten', 'sugar']
-}
+METRICS_PORT = int(os.environ.get("FOOD_METRICS_PORT", "0"))
+ADMIN_EMAILS = {e.strip().casefold() for e in os.environ.get("FOOD_ADMIN_EMAILS", "").split(",") if e.strip()}
 
-def check_allergies(dish_name, user_allergies_list):
-    ingredients = dish_ingredients.get(dish_name, [])
-    if user_allergies_list:
-        user_allergies_list = [x.strip().lower() for x in user_allergies_list.split(",") if x.strip()]
-        found = [i for i in ingredients if i.lower() in user_allergies_list]
-        return found
-    return []
-
-def overlay_allergy_alert(pil_img, allergy_list):
-    if not allergy_list:
-        return pil_img
-    draw = ImageDraw.Draw(pil_img)
-    try:
-        font = ImageFont.truetype("arial.ttf", 20)
-    except:
-        font = ImageFont.load_default()
-    text = "⚠ Allergy: " + ", ".join(allergy_list)
-    draw.text((10, 10), text, fill="red", font=font)
-    return pil_img
+def is_admin(user):
+    return user.get("role") == "admin" or user["email"].casefold() in ADMIN_EMAILS
+
+@st.cache_resource
+def get_metrics_server():
+    # One /metrics endpoint per process, shared by every session
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+get_metrics_server()
 
 # -------------------------------------------------
 # APP BEGINS (after login)
 # -------------------------------------------------
 init_storage()
+if not INFERENCE_URL:
+    get_model_registry()
+if "allergy_mask" not in st.session_state:
+    st.session_state.allergy_mask = parse_allergies(st.session_state.user.get("allergies", ""))
+if "unchecked_allergies" not in st.session_state:
+    st.session_state.unchecked_allergies = unrecognized_allergies(st.session_state.user.get("allergies", ""))
+
+def warn_unchecked_allergies(dishes=()):
+    # Allergies outside the taxonomy, or dishes without allergen data: the
+    # absence of an alert says nothing about them
+    if st.session_state.unchecked_allergies:
+        st.warning(f"⚠ Not checked for: {', '.join(st.session_state.unchecked_allergies)}")
+    unknown = [d for d in dishes if not allergen_index.knows(d)] if st.session_state.allergy_mask else []
+    if unknown:
+        st.warning(f"⚠ Allergens unknown for {', '.join(unknown)}; check the ingredients yourself")
+
+def amount(value, unit=""):
+    # Nutrition of dishes without a food_data row is unknown (None)
+    if value is None:
+        return "unknown"
+    return f"{value} {unit}" if unit else value
+
+def warn_unknown_nutrition(results):
+    unknown = [r["dish"] for r in results if r.get("calories") is None]
+    if unknown:
+        st.warning(f"⚠ No nutrition data for {', '.join(unknown)}; not counted in your daily totals")
 
 # HEADER
 with st.container():
@@ -443,47 +623,54 @@ if page == "Camera":
     img_file = st.camera_input("Take a photo")
 
     if img_file is not None:
-        pil_img = Image.open(img_file).convert("RGB")
+        with timed("decode"):
+            pil_img = open_image(img_file, max_side=DISPLAY_MAX_SIDE)
         st.image(pil_img, caption="Captured image", use_column_width=True)
         portion = st.slider("Adjust portion size", 25, 200, 100, 5)
 
         if st.button("Analyze food"):
             with st.spinner("Estimating..."):
-                result = predict_food(pil_img)
-                scale = portion / 100.0
-                calories = int(result["calories"] * scale)
-                carbs_g = int(result["carbs_g"] * scale)
-                protein_g = int(result["protein_g"] * scale)
-                fat_g = int(result["fat_g"] * scale)
+                with timed("predict"):
+                    result = predict_food(pil_img)
+                with timed("portion"):
+                    scale = portion / 100.0
+                    calories, carbs_g, protein_g, fat_g = food_model.scale_nutrition(result, scale)
 
-                user_allergies_input = st.session_state.user.get("allergies", "")
-                allergy_found = check_allergies(result['dish'], user_allergies_input)
-                pil_img = overlay_allergy_alert(pil_img, allergy_found)
+                with timed("check_allergies"):
+                    allergy_found = check_allergies(result['dish'], st.session_state.allergy_mask, allergen_index)
+                with timed("overlay_allergy_alert"):
+                    pil_img = overlay_allergy_alert(pil_img, allergy_found)
 
                 st.subheader("🔍 Predicted Result")
                 col1, col2 = st.columns([2, 1])
                 with col1:
                     st.image(pil_img, caption="Analyzed Image", use_column_width=True)
                     st.markdown(f"*Dish:* {result['dish']} ({result['confidence']:.1f}% confidence)")
-                    st.metric("Estimated Calories", f"{calories} kcal")
+                    st.metric("Estimated Calories", amount(calories, "kcal"))
                     st.write(f"*Portion:* {portion}%")
                     if allergy_found:
                         st.error(f"⚠ Allergy Detected: {', '.join(allergy_found)}")
+                    warn_unchecked_allergies([result["dish"]])
+                    warn_unknown_nutrition([result])
 
                 with col2:
                     st.markdown("*Nutrition breakdown*")
-                    st.write(f"Carbs: {carbs_g} g")
-                    st.write(f"Protein: {protein_g} g")
-                    st.write(f"Fat: {fat_g} g")
+                    if result.get("serving_size"):
+                        st.write(f"Per serving: {result['serving_size']}")
+                    st.write(f"Carbs: {amount(carbs_g, 'g')}")
+                    st.write(f"Protein: {amount(protein_g, 'g')}")
+                    st.write(f"Fat: {amount(fat_g, 'g')}")
 
                 tip = FOOD_HEALTH_TIPS.get(result['dish'], "Eat balanced meals and stay hydrated 💧.")
                 st.write(f"💡 *Health Tip:* {tip}")
 
-                img_path = save_image_file(pil_img)
+                with timed("save_image_file"):
+                    stored_img = save_image_file(pil_img)
                 entry = {
                     "id": uuid.uuid4().hex,
                     "timestamp": datetime.datetime.now().isoformat(),
                     "user": st.session_state.user["name"],
+                    "user_email": st.session_state.user["email"],
                     "dish": result["dish"],
                     "confidence": result["confidence"],
                     "calories": calories,
@@ -491,52 +678,108 @@ if page == "Camera":
                     "protein_g": protein_g,
                     "fat_g": fat_g,
                     "portion_pct": portion,
-                    "img_path": img_path,
                     "allergy_detected": allergy_found,
+                    **stored_img,
+                }
+                with timed("save_history"):
+                    save_history(entry)
+                st.session_state.last_result = {
+                    "page": "camera", "entry": entry, "saved": True,
+                    "embedding_row": result.get("embedding_row"), "cache_key": result.get("cache_key"),
                 }
-                save_history(entry)
                 st.success("Saved to your history 📚")
 
+        correct_dish("camera")
+
 # UPLOAD PAGE
 elif page == "Upload & Predict":
     st.header("📁 Upload a photo")
     uploaded_image = st.file_uploader("Upload a food image", type=["jpg", "jpeg", "png"])
 
     if uploaded_image:
-        pil_img = Image.open(uploaded_image).convert("RGB")
+        with timed("decode"):
+            pil_img = open_image(uploaded_image, max_side=DISPLAY_MAX_SIDE)
         st.image(pil_img, caption="Uploaded Food Image", use_column_width=True)
         portion = st.slider("Adjust portion size", 25, 200, 100, 5)
+        plate_mode = st.checkbox("Plate mode (several dishes in one photo)")
 
         if st.button("Analyze upload"):
             with st.spinner("Analyzing image..."):
-                result = predict_food(pil_img)
-                scale = portion / 100.0
-                calories = int(result["calories"] * scale)
-                carbs_g = int(result["carbs_g"] * scale)
-                protein_g = int(result["protein_g"] * scale)
-                fat_g = int(result["fat_g"] * scale)
-
-                user_allergies_input = st.session_state.user.get("allergies", "")
-                allergy_found = check_allergies(result['dish'], user_allergies_input)
-                pil_img = overlay_allergy_alert(pil_img, allergy_found)
+                with timed("predict"):
+                    result = analyze_plate(pil_img) if plate_mode else predict_food(pil_img)
+                with timed("portion"):
+                    scale = portion / 100.0
+                    calories, carbs_g, protein_g, fat_g = food_model.scale_nutrition(result, scale)
+
+                dishes = [item["dish"] for item in result.get("items", [result])]
+                with timed("check_allergies"):
+                    allergy_found = sorted({a for d in dishes for a in check_allergies(d, st.session_state.allergy_mask, allergen_index)})
+                with timed("overlay_allergy_alert"):
+                    pil_img = overlay_allergy_alert(pil_img, allergy_found)
 
                 st.subheader("🔍 Predicted Result:")
                 st.image(pil_img, caption="Analyzed Image", use_column_width=True)
                 st.success(f"Dish: {result['dish']} ({result['confidence']:.1f}% confidence)")
-                st.info(f"Estimated Calories: {calories} kcal")
-                st.metric("Carbs (g)", carbs_g)
-                st.metric("Protein (g)", protein_g)
-                st.metric("Fat (g)", fat_g)
+                if len(result.get("items", [])) > 1:
+                    st.dataframe(pd.DataFrame([{
+                        "Dish": item["dish"],
+                        "Confidence (%)": round(item["confidence"], 1),
+                        "Calories (kcal)": food_model.scale_nutrition(item, scale)[0],
+                    } for item in result["items"]]), use_container_width=True)
+                similar = similar_meals(result)
+                if similar:
+                    st.caption("Similar meals: " + ", ".join(f"{label} ({sim:.2f})" for label, sim in similar))
+                st.info(f"Estimated Calories: {amount(calories, 'kcal')}")
+                st.metric("Carbs (g)", amount(carbs_g))
+                st.metric("Protein (g)", amount(protein_g))
+                st.metric("Fat (g)", amount(fat_g))
                 if allergy_found:
                     st.error(f"⚠ Allergy Detected: {', '.join(allergy_found)}")
+                warn_unchecked_allergies(dishes)
+                warn_unknown_nutrition(result.get("items", [result]))
 
-                tip = FOOD_HEALTH_TIPS.get(result['dish'], "Eat balanced meals and stay hydrated 💧.")
+                tip = FOOD_HEALTH_TIPS.get(dishes[0], "Eat balanced meals and stay hydrated 💧.")
                 st.write(f"💡 *Health Tip:* {tip}")
 
+                if "items" not in result:
+                    st.session_state.last_result = {
+                        "page": "upload", "saved": False,
+                        "embedding_row": result.get("embedding_row"), "cache_key": result.get("cache_key"),
+                        "entry": {
+                            "dish": result["dish"], "confidence": result["confidence"],
+                            "calories": calories, "carbs_g": carbs_g, "protein_g": protein_g, "fat_g": fat_g,
+                            "portion_pct": portion, "allergy_detected": allergy_found,
+                        },
+                    }
+                else:
+                    st.session_state.pop("last_result", None)
+
+        correct_dish("upload")
+
 # HISTORY PAGE
 elif page == "History":
     st.header("📚 Food History")
-    hist = load_history()
+
+    # Trends come from the per-day rollups, not from the raw entries
+    goal = st.number_input("Daily calorie goal (kcal)", min_value=500, max_value=6000,
+                           value=DAILY_CALORIE_GOAL, step=50, key="calorie_goal")
+    today = history_store.day_totals(current_user_key(), datetime.date.today().isoformat())
+    st.progress(min(1.0, today["calories"] / goal))
+    st.write(f"Today: {int(today['calories'])} / {goal} kcal • {today['entries']} meals"
+             + (f" • ⚠ {today['allergy_hits']} allergy alerts" if today["allergy_hits"] else ""))
+
+    view = st.radio("Trend", ["Daily", "Weekly", "Monthly"], horizontal=True)
+    period, span = {"Daily": ("day", 30), "Weekly": ("week", 12), "Monthly": ("month", 12)}[view]
+    rollups = history_store.rollup(current_user_key(), period, limit=span)
+    if rollups:
+        trend = pd.DataFrame(rollups).set_index("period")
+        st.line_chart(trend[["calories"]])
+        st.bar_chart(trend[["carbs_g", "protein_g", "fat_g"]])
+
+    total = history_store.count(current_user_key())
+    pages = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+    page_no = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1) if pages > 1 else 1
+    hist = load_history(HISTORY_PAGE_SIZE, (page_no - 1) * HISTORY_PAGE_SIZE)
     if not hist:
         st.info("No history yet — capture or upload an image.")
     else:
@@ -550,6 +793,10 @@ elif page == "History":
 
         st.dataframe(df, use_container_width=True)
 
+        thumbs = [(h["thumb_path"], h["dish"]) for h in hist if h.get("thumb_path") and os.path.exists(h["thumb_path"])]
+        if thumbs:
+            st.image([p for p, _ in thumbs], caption=[d for _, d in thumbs], width=96)
+
         if st.button("Clear history"):
             clear_history()
             st.success("History cleared")
@@ -559,8 +806,39 @@ elif page == "History":
 elif page == "Profile & Settings":
     st.header("⚙ Profile & Settings")
 
+    if is_admin(st.session_state.user):
+        with st.expander("🩺 Diagnostics"):
+            rows = METRICS.snapshot()
+            if rows:
+                st.dataframe(pd.DataFrame(rows), use_container_width=True)
+            else:
+                st.info("No timings recorded yet.")
+            st.write(f"Prediction cache hit rate: {prediction_cache.hit_rate():.0%} "
+                     f"({prediction_cache.hits} hits, {prediction_cache.misses} misses)")
+            version = get_model_registry().current(timeout=0) if not INFERENCE_URL else None
+            if version is not None:
+                st.write(f"Model version: {version.name or 'unversioned'} "
+                         f"({len(version.classes)} classes, {get_model_registry().swaps} hot swaps)")
+            tiny = get_tiny_model(version)
+            if tiny is not None:
+                st.write(f"Cascade: tiny model answered {tiny.hit_rate():.0%} "
+                         f"({tiny.accepted} kept, {tiny.escalated} escalated, threshold {tiny.threshold:.2f})")
+            if get_metrics_server() is not None:
+                st.write(f"Prometheus endpoint: http://127.0.0.1:{METRICS_PORT}/metrics")
+            st.download_button("Download metrics (Prometheus text)", METRICS.render_prometheus(),
+                               file_name="metrics.prom", mime="text/plain")
+
+    allergy_mask = st.session_state.allergy_mask
+    if allergy_mask:
+        st.subheader("🥗 Dishes safe for you")
+        st.caption("Screening for: " + ", ".join(names_of(allergy_mask)))
+        st.write(", ".join(allergen_index.safe_dishes(allergy_mask)) or "No known dishes are free of your allergens.")
+    warn_unchecked_allergies()
+
     if st.button("Logout"):
         st.session_state.user = None
+        st.session_state.pop("allergy_mask", None)
+        st.session_state.pop("unchecked_allergies", None)
         st.session_state.auth_page = "login"
         st.experimental_rerun()
 
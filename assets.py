@@ -0,0 +1,74 @@
+# ------------------------------
+# assets.py
+# Builds display-size WebP/JPEG variants of the page images into static/,
+# which Streamlit serves at app/static/ (server.enableStaticServing).
+#
+#   python assets.py        # prebuild, e.g. at deploy time
+# ------------------------------
+
+import os
+
+from PIL import Image, ImageOps, features
+
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+
+# source image -> max display width in pixels
+ASSET_SOURCES = {
+    "background.jpg": 1920,
+    "abc.jpg": 800,
+    "rt.jpg": 800,
+}
+
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+HAS_WEBP = features.check("webp")
+
+
+def _is_fresh(src, out):
+    return os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(src)
+
+def build_variants(src, max_width, static_dir=STATIC_DIR):
+    """Write resized JPEG (and WebP when available) copies of ``src``.
+
+    Returns {"jpg": path, "webp": path}. Up-to-date outputs are reused.
+    """
+    os.makedirs(static_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    outputs = {"jpg": os.path.join(static_dir, f"{stem}.jpg")}
+    if HAS_WEBP:
+        outputs["webp"] = os.path.join(static_dir, f"{stem}.webp")
+
+    if all(_is_fresh(src, out) for out in outputs.values()):
+        return outputs
+
+    img = ImageOps.exif_transpose(Image.open(src)).convert("RGB")
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+
+    # Write to a temp name first so a concurrent reader never sees half a file
+    for fmt, out in outputs.items():
+        tmp = out + ".tmp"
+        if fmt == "webp":
+            img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=6)
+        else:
+            img.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp, out)
+    return outputs
+
+def build_assets(sources=None, static_dir=STATIC_DIR):
+    sources = ASSET_SOURCES if sources is None else sources
+    return {
+        src: build_variants(src, max_width, static_dir)
+        for src, max_width in sources.items()
+        if os.path.exists(src)
+    }
+
+def static_url(path):
+    return f"{STATIC_URL}/{os.path.basename(path)}"
+
+
+if __name__ == "__main__":
+    for src, outputs in build_assets().items():
+        sizes = ", ".join(f"{os.path.basename(p)} {os.path.getsize(p) // 1024} KB" for p in outputs.values())
+        print(f"✅ {src} ({os.path.getsize(src) // 1024} KB) -> {sizes}")
@@ -0,0 +1,239 @@
+# ------------------------------
+# benchmark.py
+# Times the estimator's hot paths on synthetic fixtures.
+#
+#   python benchmark.py                                  # print results
+#   python benchmark.py --output bench.json              # write JSON
+#   python benchmark.py --save-baseline benchmarks/baseline.json
+#   python benchmark.py --baseline benchmarks/baseline.json --max-regression 0.25
+#   python benchmark.py --scale 100000                   # history/user store size
+#
+# Uses models/custom_food_model.h5 when present, otherwise a deterministic
+# stub model so the numbers are comparable on machines without TensorFlow.
+# ------------------------------
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import food_model
+from allergies import check_allergies, overlay_allergy_alert
+from history_store import HistoryStore
+from image_store import ImageStore
+from nutrition import NutritionIndex, NUTRITION_DB
+from user_store import UserStore
+
+
+# ------------------------------
+# Fixtures
+# ------------------------------
+class StubModel:
+    """Deterministic stand-in for the Keras model: softmax over a fixed
+    projection of each image's mean colour."""
+
+    def __init__(self, num_classes=len(food_model.FOOD_CLASSES), seed=0):
+        self.proj = np.random.default_rng(seed).normal(size=(3, num_classes)).astype(np.float32)
+
+    def predict_on_batch(self, x):
+        logits = x.mean(axis=(1, 2)) @ self.proj * 10
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, x, batch_size=32, verbose=0):
+        return self.predict_on_batch(x)
+
+def synthetic_image(size=(1024, 768), seed=0):
+    rng = np.random.default_rng(seed)
+    # Smooth gradient plus noise: compresses like a photo, unlike pure noise
+    h, w = size[1], size[0]
+    base = np.linspace(0, 255, w, dtype=np.float32)[None, :, None] * np.ones((h, 1, 3), np.float32)
+    noise = rng.normal(0, 20, size=(h, w, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+
+def history_entry(i, user):
+    return {
+        "id": f"bench-{i}",
+        "timestamp": f"2025-01-01T00:00:{i % 60:02d}.{i:06d}",
+        "user": user,
+        "user_email": user,
+        "dish": food_model.FOOD_CLASSES[i % len(food_model.FOOD_CLASSES)],
+        "confidence": 90.0,
+        "calories": 300,
+        "carbs_g": 30,
+        "protein_g": 10,
+        "fat_g": 10,
+        "portion_pct": 100,
+        "allergy_detected": [],
+    }
+
+
+# ------------------------------
+# Timing
+# ------------------------------
+def timeit(fn, repeat, setup=None, warmup=1):
+    for _ in range(warmup):
+        fn(setup() if setup else None)
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "median_ms": times[len(times) // 2] * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        "runs": repeat,
+    }
+
+
+# ------------------------------
+# Benchmarks
+# ------------------------------
+def bench_predict(results, model, repeat):
+    img = synthetic_image()
+    nutrition = NutritionIndex(NUTRITION_DB)
+    results["predict_food.preprocess"] = timeit(lambda _: food_model.preprocess_batch([img]), repeat)
+    x = food_model.preprocess_batch([img])
+    results["predict_food.inference"] = timeit(lambda _: model.predict_on_batch(x), repeat)
+    results["predict_food"] = timeit(lambda _: food_model.predict_food(model, img, nutrition=nutrition), repeat)
+
+def bench_allergies(results, repeat):
+    results["check_allergies"] = timeit(
+        lambda _: check_allergies("Burger", "nuts, dairy, gluten, shellfish"), repeat * 100
+    )
+    img = synthetic_image()
+    results["overlay_allergy_alert"] = timeit(
+        lambda im: overlay_allergy_alert(im, ["dairy", "gluten"]), repeat, setup=img.copy
+    )
+
+def bench_image_store(results, tmp, repeat):
+    store = ImageStore(os.path.join(tmp, "images"))
+    seeds = iter(range(10 ** 6))
+    new_image = lambda: synthetic_image(seed=next(seeds))
+    # Request-path cost (hash + enqueue) and full cost including the JPEG writes
+    results["save_image_file"] = timeit(lambda im: store.put(im), repeat, setup=new_image)
+    results["save_image_file.flushed"] = timeit(lambda im: (store.put(im), store.flush()), repeat, setup=new_image)
+
+def bench_history(results, tmp, scale, repeat):
+    store = HistoryStore(os.path.join(tmp, "history.db"))
+    per_user = store.limit
+    users = [f"user{u}@example.com" for u in range(max(1, scale // per_user))]
+
+    def fill(conn):
+        for i in range(scale):
+            user = users[i % len(users)]
+            store._insert(conn, user, history_entry(i, user))
+    store._write(fill)
+
+    counter = iter(range(scale, scale + 10 ** 6))
+    results[f"save_history@{scale}"] = timeit(
+        lambda _: store.append(history_entry(next(counter), users[0]), users[0]), repeat
+    )
+    results[f"load_history@{scale}"] = timeit(lambda _: store.page(users[len(users) // 2], 20, 0), repeat)
+
+def bench_users(results, tmp, scale, repeat):
+    path = os.path.join(tmp, "users.json")
+    with open(path, "w") as f:
+        json.dump([{"name": f"user {i}", "age": 30, "gender": "Other", "allergies": "", "medications": "",
+                    "email": f"User{i}@Example.com", "password": f"pw{i}"} for i in range(scale)], f)
+    store = UserStore(path)
+    store.find("warm@up")
+    target = f"user{scale - 1}@example.com"
+
+    def authenticate(email, password):
+        user = store.find(email)
+        return bool(user and user["password"] == password)
+
+    results[f"find_user@{scale}"] = timeit(lambda _: store.find(target), repeat * 10)
+    results[f"authenticate@{scale}"] = timeit(lambda _: authenticate(target, f"pw{scale - 1}"), repeat * 10)
+
+
+def run(scale, repeat, model):
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="food-bench-")
+    try:
+        bench_predict(results, model, repeat)
+        bench_allergies(results, repeat)
+        bench_image_store(results, tmp, repeat)
+        bench_history(results, tmp, scale, repeat)
+        bench_users(results, tmp, scale, repeat)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+def compare(results, baseline, max_regression):
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        limit = base["median_ms"] * (1 + max_regression)
+        if res["median_ms"] > limit:
+            regressions.append((name, base["median_ms"], res["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the food estimator's hot paths.")
+    parser.add_argument("--scale", type=int, default=10000, help="Entries in the history and user stores")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this results JSON")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed slowdown of a median vs. the baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", help="Write results as the new baseline")
+    parser.add_argument("--stub-model", action="store_true", help="Always use the stub model")
+    args = parser.parse_args(argv)
+
+    model = None if args.stub_model or not os.path.exists(food_model.MODEL_PATH) else food_model.load_cnn_model()
+    model_name = food_model.MODEL_PATH if model is not None else "stub"
+    if model is None:
+        model = StubModel()
+
+    results = run(args.scale, args.repeat, model)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": model_name,
+            "scale": args.scale,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    for name, res in results.items():
+        print(f"{name:32s} median {res['median_ms']:9.3f} ms   p95 {res['p95_ms']:9.3f} ms")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            for name, before, after in regressions:
+                print(f"❌ {name}: {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ No regressions over {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# ------------------------------
+# cascade.py
+# Two-tier classification: a tiny low-resolution MobileNetV2 answers first
+# and only images it is unsure about go through the full 224px model.
+#
+#   python train_model.py --cascade            # trains + calibrates the tiny tier
+#   python train_model.py --cascade --tflite int8   # ... plus TFLite copies of both tiers
+#   python cascade.py --dataset dataset        # per-tier hit rate / latency report
+#
+# With FOOD_MODEL_BACKEND=tflite the tiny tier runs from its TFLite export,
+# so the cascade never imports TensorFlow either.
+# ------------------------------
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from metrics import REGISTRY, timed
+from preprocessing import load_for_model, to_model_input
+from tflite_backend import QUANT_MODES, TFLiteModel, tflite_path
+
+TINY_MODEL_PATH = "models/tiny_food_model.h5"
+TINY_IMG_SIZE = (96, 96)
+TINY_ALPHA = 0.35
+TARGET_ACCURACY = 0.95   # accuracy the tiny tier must reach on the images it keeps
+NEVER = 1.01             # threshold no softmax output reaches: always escalate
+FEATURES_LAYER = -2      # GlobalAveragePooling2D, right before the softmax
+
+def calibration_path(model_path):
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+# ------------------------------
+# Training / calibration
+# ------------------------------
+def build_tiny_model(num_classes, img_size=TINY_IMG_SIZE, alpha=TINY_ALPHA):
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+
+    base = MobileNetV2(weights="imagenet", include_top=False, alpha=alpha, input_shape=img_size[::-1] + (3,))
+    base.trainable = False
+    outputs = Dense(num_classes, activation="softmax")(GlobalAveragePooling2D()(base.output))
+    return Model(inputs=base.input, outputs=outputs)
+
+def calibrate_threshold(probs, labels, target_accuracy=TARGET_ACCURACY):
+    """Lowest confidence threshold whose accepted images are still at least
+    ``target_accuracy`` correct. Returns (threshold, accept_rate, accepted_accuracy)."""
+    probs = np.asarray(probs)
+    conf = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == np.asarray(labels)
+    order = np.argsort(-conf)
+    accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    ok = np.flatnonzero(accuracy >= target_accuracy)
+    if len(ok) == 0:
+        return NEVER, 0.0, 0.0
+    k = ok[-1]
+    return float(conf[order[k]]), float((k + 1) / len(order)), float(accuracy[k])
+
+def save_tiny_model(model, threshold, path=TINY_MODEL_PATH, **stats):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    model.save(path)
+    size = tuple(int(d) for d in model.input.shape[1:3])[::-1]
+    with open(calibration_path(path), "w") as f:
+        json.dump({"threshold": threshold, "img_size": size, **stats}, f, indent=2)
+
+
+# ------------------------------
+# Inference
+# ------------------------------
+class TinyModel:
+    """The first tier: probabilities and pooled features at low resolution,
+    plus the gate. ``model`` is a TFLiteModel or a Keras model with
+    [features, probabilities] outputs (see load)."""
+
+    def __init__(self, model, threshold, img_size=TINY_IMG_SIZE, registry=REGISTRY):
+        self.model = model
+        self.threshold = threshold
+        self.img_size = tuple(img_size)
+        self.registry = registry
+        self.accepted = 0
+        self.escalated = 0
+
+    @classmethod
+    def load(cls, path=TINY_MODEL_PATH, backend=None):
+        """None when the tiny model was never trained (no cascade), or when
+        ``backend`` (default food_model.MODEL_BACKEND) is "tflite" and there
+        is no TFLite export of it."""
+        import food_model
+        if not os.path.exists(calibration_path(path)):
+            return None
+        with open(calibration_path(path)) as f:
+            calib = json.load(f)
+        if (backend or food_model.MODEL_BACKEND) == "tflite":
+            exports = [tflite_path(path, mode) for mode in QUANT_MODES if os.path.exists(tflite_path(path, mode))]
+            if not exports:
+                print(f"⚠ No TFLite export of {path} (train_model.py --cascade --tflite); cascade disabled")
+                return None
+            model = TFLiteModel(exports[0], num_threads=food_model.TFLITE_THREADS)
+        else:
+            if not os.path.exists(path):
+                return None
+            from tensorflow.keras.models import Model, load_model
+            keras_model = load_model(path, compile=False)
+            model = Model(inputs=keras_model.input,
+                          outputs=[keras_model.layers[FEATURES_LAYER].output, keras_model.output])
+        tiny = cls(model, calib["threshold"], calib["img_size"])
+        tiny._run(np.zeros((1, tiny.img_size[1], tiny.img_size[0], 3), dtype=np.float32))
+        return tiny
+
+    def _run(self, x):
+        if hasattr(self.model, "predict_with_features"):
+            features, probs = self.model.predict_with_features(x)
+        else:
+            features, probs = self.model.predict_on_batch(x)
+        return np.asarray(probs), (np.asarray(features) if features is not None else None)
+
+    def predict_images(self, pil_imgs):
+        """(probabilities, pooled features) at the tiny model's resolution."""
+        with timed("cascade_tiny", self.registry):
+            return self._run(to_model_input(pil_imgs, self.img_size))
+
+    def gate(self, probs):
+        """Boolean mask of the predictions the tiny tier keeps."""
+        keep = np.asarray(probs).max(axis=1) >= self.threshold
+        kept = int(keep.sum())
+        self.accepted += kept
+        self.escalated += len(keep) - kept
+        self.registry.inc("cascade_tiny_accepted", kept)
+        self.registry.inc("cascade_escalated", len(keep) - kept)
+        return keep
+
+    def hit_rate(self):
+        total = self.accepted + self.escalated
+        return self.accepted / total if total else 0.0
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def main(argv=None):
+    import food_model
+    from data_pipeline import list_class_files, split_files
+
+    parser = argparse.ArgumentParser(description="Per-tier hit rate and latency of the cascade.")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--tiny", default=TINY_MODEL_PATH)
+    parser.add_argument("--model", default=food_model.MODEL_PATH)
+    parser.add_argument("--all", action="store_true", help="Use every image, not just the validation split")
+    args = parser.parse_args(argv)
+
+    tiny = TinyModel.load(args.tiny)
+    full = food_model.load_and_warm_up(args.model)
+    if tiny is None or full is None:
+        parser.error("needs both the tiny model (train_model.py --cascade) and the full model")
+
+    class_indices, files = list_class_files(args.dataset)
+    train, val = split_files(class_indices, files)
+    samples = train + val if args.all or not val else val
+    if not samples:
+        parser.error(f"no images under {args.dataset}")
+
+    tiers = {"tiny": [], "full": []}
+    full_only_s = 0.0
+    correct = cascade_correct = 0
+    for path, label in samples:
+        img = load_for_model(path)
+        t0 = time.perf_counter()
+        probs = tiny.predict_images([img])[0]
+        keep = tiny.gate(probs)[0]
+        if not keep:
+            probs = food_model.predict_proba_batch(full, [img])
+        tiers["tiny" if keep else "full"].append(time.perf_counter() - t0)
+        cascade_correct += int(np.argmax(probs[0]) == label)
+
+        t0 = time.perf_counter()
+        correct += int(np.argmax(food_model.predict_proba_batch(full, [img])[0]) == label)
+        full_only_s += time.perf_counter() - t0
+
+    n = len(samples)
+    cascade_s = sum(tiers["tiny"]) + sum(tiers["full"])
+    print(f"🔀 Threshold {tiny.threshold:.3f} on {n} images")
+    for tier, times in tiers.items():
+        if times:
+            print(f"  {tier:<5} {len(times) / n:6.1%} of requests, {np.mean(times) * 1000:7.1f} ms mean")
+    print(f"⏱ Mean latency {cascade_s / n * 1000:.1f} ms cascade vs {full_only_s / n * 1000:.1f} ms full model only")
+    print(f"🎯 Accuracy {cascade_correct / n:.1%} cascade vs {correct / n:.1%} full model only")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,17 @@
 import sqlite3
 
-# Connect or create a new database
-conn = sqlite3.connect("food_calories.db")
+from allergies import ensure_allergen_tables
+from food_search import ensure_search_index
+from nutrition import NUTRITION_DB, ensure_food_schema
 
-# Create a cursor to execute SQL commands
-cursor = conn.cursor()
-
-# Create table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS food_data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    calories REAL NOT NULL,
-    protein REAL,
-    fat REAL,
-    carbs REAL,
-    serving_size TEXT
-)
-''')
-
-# Save and close
-conn.commit()
-conn.close()
+# Create database/food_calories.db, or upgrade an existing one (merges
+# duplicate food names and adds the unique name index imports upsert on)
+ensure_food_schema(NUTRITION_DB)
+ensure_allergen_tables(NUTRITION_DB)
+try:
+    ensure_search_index(NUTRITION_DB)
+except sqlite3.OperationalError as e:
+    # e.g. SQLite built without FTS5 / the trigram tokenizer
+    print(f"⚠ No food search index ({e}); dish search will match name prefixes only")
 
 print("✅ Database and table created successfully!")
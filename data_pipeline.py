@@ -0,0 +1,123 @@
+# ------------------------------
+# data_pipeline.py
+# tf.data input pipeline for dataset/<class>/ image folders
+# ------------------------------
+
+import glob
+import hashlib
+import os
+import tensorflow as tf
+
+AUTOTUNE = tf.data.AUTOTUNE
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+
+
+# ------------------------------
+# File listing / split
+# ------------------------------
+def list_class_files(dataset_dir):
+    """Returns (class_indices, {class_name: sorted file paths}).
+
+    Classes are the sorted sub-folder names, the same order
+    flow_from_directory used for class_indices.
+    """
+    classes = sorted(
+        d for d in os.listdir(dataset_dir)
+        if os.path.isdir(os.path.join(dataset_dir, d))
+    )
+    class_indices = {c: i for i, c in enumerate(classes)}
+    files = {}
+    for c in classes:
+        paths = []
+        for root, dirnames, filenames in os.walk(os.path.join(dataset_dir, c)):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                if os.path.splitext(fname)[1].lower() in IMAGE_EXTS:
+                    paths.append(os.path.join(root, fname))
+        files[c] = paths
+    return class_indices, files
+
+def split_files(class_indices, files, validation_split=0.2):
+    # Same rule as ImageDataGenerator(validation_split=...): per class, the
+    # first int(split * n) sorted files are validation, the rest training.
+    train, val = [], []
+    for c, paths in files.items():
+        cut = int(validation_split * len(paths))
+        label = class_indices[c]
+        val += [(p, label) for p in paths[:cut]]
+        train += [(p, label) for p in paths[cut:]]
+    return train, val
+
+
+# ------------------------------
+# Dataset construction
+# ------------------------------
+def _decode(img_size):
+    def fn(path, label):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        img = tf.image.resize(img, img_size)
+        # Cache as uint8: a quarter of the memory/disk of float32
+        return tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8), label
+    return fn
+
+def _to_model_input(num_classes):
+    def fn(img, label):
+        return tf.cast(img, tf.float32) / 255.0, tf.one_hot(label, num_classes)
+    return fn
+
+def build_dataset(samples, num_classes, img_size, batch_size, training, cache="", seed=123):
+    """``cache`` = "" caches decoded images in memory, a path caches them on
+    disk, None disables caching."""
+    if not samples:
+        return None
+    paths = [p for p, _ in samples]
+    labels = [l for _, l in samples]
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(_decode(img_size), num_parallel_calls=AUTOTUNE, deterministic=True)
+    if cache is not None:
+        ds = ds.cache(cache)
+    if training:
+        ds = ds.shuffle(len(samples), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(_to_model_input(num_classes), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+def cache_path(cache_dir, prefix, samples, img_size, seed, validation_split):
+    """Disk cache file for ``samples``. tf.data reuses an existing cache file
+    whatever its inputs were, so the name hashes everything the cached
+    images depend on; older caches of the same size are deleted."""
+    h = hashlib.sha256(f"{img_size[0]}x{img_size[1]}:{seed}:{validation_split}".encode())
+    for path, label in samples:
+        try:
+            st = os.stat(path)
+            stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            stamp = "-"
+        h.update(f"\n{path}\t{label}\t{stamp}".encode())
+    base = f"{prefix}_{img_size[0]}x{img_size[1]}"
+    name = f"{base}_{h.hexdigest()[:16]}"
+    for stale in glob.glob(os.path.join(cache_dir, f"{base}_*")):
+        if not os.path.basename(stale).startswith(name):
+            os.remove(stale)
+    return os.path.join(cache_dir, name)
+
+def make_datasets(dataset_dir, img_size=(224, 224), batch_size=8, validation_split=0.2, cache_dir=None, seed=123):
+    """Returns (train_ds, val_ds, class_indices).
+
+    With ``cache_dir`` the decoded images are cached in files under it
+    instead of in memory.
+    """
+    class_indices, files = list_class_files(dataset_dir)
+    train, val = split_files(class_indices, files, validation_split)
+
+    train_cache = val_cache = ""
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        train_cache = cache_path(cache_dir, "train", train, img_size, seed, validation_split)
+        val_cache = cache_path(cache_dir, "val", val, img_size, seed, validation_split)
+
+    num_classes = len(class_indices)
+    train_ds = build_dataset(train, num_classes, img_size, batch_size, True, train_cache, seed)
+    val_ds = build_dataset(val, num_classes, img_size, batch_size, False, val_cache, seed)
+    print(f"Found {len(train)} training and {len(val)} validation images belonging to {num_classes} classes.")
+    return train_ds, val_ds, class_indices
@@ -1,7 +1,12 @@
+import os
 import sqlite3
+import sys
 
-# Connect to your existing database
-conn = sqlite3.connect("food_calories.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nutrition import normalize_food_name
+
+# Connect to your existing database (run create_db.py first)
+conn = sqlite3.connect(os.path.join(os.path.dirname(os.path.abspath(__file__)), "food_calories.db"))
 cursor = conn.cursor()
 
 # Sample food data
@@ -13,14 +18,22 @@ foods = [
     ("Pizza Slice", 285, 12, 10, 36, "1 slice"),
     ("Burger", 354, 17, 20, 29, "1 burger"),
     ("Chapati", 120, 3.1, 3.6, 18, "1 piece"),
-    ("Paneer Curry", 300, 15, 25, 5, "1 bowl")
+    ("Paneer Curry", 300, 15, 25, 5, "1 bowl"),
+    # The rest of the model's classes (Apple, Burger and Pizza -> Pizza Slice are above)
+    ("Avocado", 240, 3, 22, 13, "1 medium"),
+    ("Bread", 80, 3, 1, 14, "1 slice"),
+    ("Milk", 150, 8, 8, 12, "1 cup"),
 ]
 
-# Insert data into table
+# Insert data into table; running this again updates the rows instead of
+# duplicating them (bulk tables: import_nutrition.py)
 cursor.executemany('''
-INSERT INTO food_data (name, calories, protein, fat, carbs, serving_size)
-VALUES (?, ?, ?, ?, ?, ?)
-''', foods)
+INSERT INTO food_data (name, name_key, calories, protein, fat, carbs, serving_size)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name_key) DO UPDATE SET
+    calories = excluded.calories, protein = excluded.protein, fat = excluded.fat,
+    carbs = excluded.carbs, serving_size = excluded.serving_size
+''', [(name, normalize_food_name(name), *values) for name, *values in foods])
 
 conn.commit()
 conn.close()
@@ -0,0 +1,309 @@
+# ------------------------------
+# embedding_store.py
+# Pooled MobileNetV2 feature vectors of labeled and analyzed images, for
+# similar-meal search and nearest-neighbour classification of dishes the
+# CNN was never trained on.
+#
+#   python embedding_store.py add-dataset dataset            # label = folder name
+#   python embedding_store.py add --label "Masala Dosa" dosa1.jpg dosa2.jpg
+#   python embedding_store.py build-index
+#   python embedding_store.py search photo.jpg
+# ------------------------------
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+EMBEDDING_DIR = "embeddings"
+INDEX_MIN_ITEMS = 20000   # below this a brute-force scan is faster than probing clusters
+N_PROBE = 8
+# Feature space a row's vector comes from: the full model's pooled output,
+# or the cascade's tiny model (cascade.py). Rows only compare within a space.
+FULL_SPACE = "full"
+TINY_SPACE = "tiny"
+
+
+class EmbeddingStore:
+    """Unit-normalized float32 vectors in a memory-mapped vectors.npy, with
+    labels and provenance in items.db. Cosine similarity is a single
+    matrix-vector product over the rows.
+
+    ``verified`` rows (curated labels) are the only ones that vote when the
+    store is used as a classifier; every row is searchable. Each row also
+    records its feature ``space``; searches never mix spaces.
+
+    Several processes (app workers) may share one directory: row numbers
+    are taken under an items.db write lock, and each process picks up the
+    others' rows on its next add or search.
+    """
+
+    def __init__(self, root=EMBEDDING_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.matrix_path = os.path.join(root, "vectors.npy")
+        self.index_path = os.path.join(root, "clusters.npz")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "items.db"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "row INTEGER PRIMARY KEY, label TEXT NOT NULL, source TEXT, "
+            "verified INTEGER NOT NULL DEFAULT 1, added REAL NOT NULL, "
+            f"space TEXT NOT NULL DEFAULT '{FULL_SPACE}')"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(items)")}
+        if "space" not in columns:
+            # Stores created before the tiny tier remembered anything
+            self._db.execute(f"ALTER TABLE items ADD COLUMN space TEXT NOT NULL DEFAULT '{FULL_SPACE}'")
+        self._db.commit()
+
+        self.count = 0
+        self.labels = []
+        self.verified = np.zeros(0, dtype=bool)
+        self.spaces = np.zeros(0, dtype=object)
+        # Created on the first add, when the feature width is known
+        self.matrix = None
+        self._matrix_ino = None
+        self._refresh()
+        self._load_index()
+
+    # ---------------- storage ----------------
+    def refresh(self):
+        """Load the rows other processes added since the last look."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        n = self._db.execute("SELECT coalesce(max(row) + 1, 0) FROM items").fetchone()[0]
+        if n > self.count:
+            rows = self._db.execute(
+                "SELECT label, verified, space FROM items WHERE row >= ? ORDER BY row", (self.count,)
+            ).fetchall()
+            self.labels = self.labels + [label for label, _, _ in rows]
+            self.verified = np.concatenate([self.verified, np.array([bool(v) for _, v, _ in rows], dtype=bool)])
+            self.spaces = np.concatenate([self.spaces, np.array([s for _, _, s in rows], dtype=object)])
+            self.count = n
+        # Checked after the count: the file holds at least the rows counted.
+        # A grow replaces it, so a new inode means this mapping is stale.
+        try:
+            ino = os.stat(self.matrix_path).st_ino
+        except FileNotFoundError:
+            return
+        if ino != self._matrix_ino:
+            self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+            self._matrix_ino = ino
+
+    def _grow(self, needed, dim):
+        if self.matrix is None:
+            self.matrix = np.lib.format.open_memmap(
+                self.matrix_path, mode="w+", dtype=np.float32, shape=(max(1024, needed), dim))
+            self._matrix_ino = os.stat(self.matrix_path).st_ino
+            return
+        if self.matrix.shape[1] != dim:
+            raise ValueError(f"expected {self.matrix.shape[1]}-d vectors, got {dim}-d")
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self.matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, dim))
+        grown[:self.count] = self.matrix[:self.count]
+        grown.flush()
+        del grown
+        del self.matrix
+        os.replace(tmp, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+        self._matrix_ino = os.stat(self.matrix_path).st_ino
+
+    @staticmethod
+    def normalize(vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, vectors, labels, sources=None, verified=True, space=FULL_SPACE):
+        """Append rows; returns their row numbers."""
+        vectors = self.normalize(vectors)
+        sources = sources or [None] * len(vectors)
+        with self._lock:
+            # The write lock serializes adds across processes; inside it this
+            # process first catches up, so its count is the next free row
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                start = self.count
+                self._grow(start + len(vectors), vectors.shape[1])
+                self.matrix[start:start + len(vectors)] = vectors
+                self.matrix.flush()
+                now = time.time()
+                self._db.executemany(
+                    "INSERT INTO items (row, label, source, verified, added, space) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(start + i, label, src, int(verified), now, space)
+                     for i, (label, src) in enumerate(zip(labels, sources))],
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            self.labels = self.labels + list(labels)
+            self.verified = np.concatenate([self.verified, np.full(len(vectors), bool(verified))])
+            self.spaces = np.concatenate([self.spaces, np.full(len(vectors), space, dtype=object)])
+            self.count += len(vectors)
+        return list(range(start, start + len(vectors)))
+
+    def known_labels(self, space=FULL_SPACE):
+        return sorted({l for l, v, s in zip(self.labels, self.verified, self.spaces) if v and s == space})
+
+    # ---------------- coarse index ----------------
+    def _load_index(self):
+        self.centroids = None
+        self.assignments = None
+        self.indexed = 0
+        if os.path.exists(self.index_path):
+            data = np.load(self.index_path)
+            self.centroids = data["centroids"]
+            self.assignments = data["assignments"]
+            self.indexed = len(self.assignments)
+
+    def build_index(self, n_clusters=None, iters=10, seed=0):
+        """Spherical k-means over the current rows. Rows added later are
+        scanned directly until the next build."""
+        n = self.count
+        if n == 0:
+            return
+        n_clusters = n_clusters or max(1, int(np.sqrt(n)))
+        data = np.asarray(self.matrix[:n])
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(n, size=min(n_clusters, n), replace=False)].copy()
+        for _ in range(iters):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = data[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = self.normalize(centroids)
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        np.savez(self.index_path, centroids=centroids, assignments=assignments)
+        self._load_index()
+
+    def _candidates(self, query, n_probe, n):
+        if self.centroids is None or self.indexed < INDEX_MIN_ITEMS:
+            return None
+        probe = np.argsort(-(self.centroids @ query))[:n_probe]
+        rows = np.flatnonzero(np.isin(self.assignments, probe))
+        # Plus everything added since the index was built
+        return np.concatenate([rows, np.arange(self.indexed, n)])
+
+    # ---------------- queries ----------------
+    def search(self, vector, k=5, verified_only=False, n_probe=N_PROBE, space=FULL_SPACE):
+        """k nearest rows of ``space`` by cosine similarity: [(label, similarity, row)]."""
+        self.refresh()
+        # One consistent view; rows past n may still be mid-add in this process
+        n, matrix, labels, verified, spaces = self.count, self.matrix, self.labels, self.verified, self.spaces
+        if n == 0:
+            return []
+        query = self.normalize(vector)[0]
+        rows = self._candidates(query, n_probe, n)
+        if rows is None:
+            scores = np.asarray(matrix[:n]) @ query
+            rows = np.arange(n)
+        else:
+            scores = np.asarray(matrix[rows]) @ query
+        keep = spaces[rows] == space
+        if verified_only:
+            keep &= verified[rows]
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) == 0:
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(labels[rows[i]], float(scores[i]), int(rows[i])) for i in top]
+
+    def vote(self, vector, k=5, space=FULL_SPACE):
+        """Similarity-weighted vote of the k nearest verified rows:
+        (label, share of the vote, best similarity) or None."""
+        neighbours = self.search(vector, k, verified_only=True, space=space)
+        if not neighbours:
+            return None
+        weights = {}
+        for label, sim, _ in neighbours:
+            weights[label] = weights.get(label, 0.0) + max(sim, 0.0)
+        total = sum(weights.values())
+        label = max(weights, key=weights.get)
+        best = max(sim for l, sim, _ in neighbours if l == label)
+        return label, (weights[label] / total if total else 0.0), best
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def _embed_files(model, paths, batch_size=32):
+    import food_model
+    from preprocessing import load_for_model
+    vectors = []
+    for i in range(0, len(paths), batch_size):
+        imgs = [load_for_model(p) for p in paths[i:i + batch_size]]
+        vectors.append(food_model.predict_with_embeddings(model, imgs)[1])
+    return np.concatenate(vectors) if vectors else np.empty((0, 0), np.float32)
+
+def main(argv=None):
+    import food_model
+    from data_pipeline import IMAGE_EXTS
+    from model_registry import label_for_folder
+
+    parser = argparse.ArgumentParser(description="Manage the dish embedding store.")
+    parser.add_argument("--store", default=EMBEDDING_DIR)
+    parser.add_argument("--model", default=food_model.MODEL_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_add = sub.add_parser("add", help="Add labeled images")
+    p_add.add_argument("--label", required=True)
+    p_add.add_argument("images", nargs="+")
+    p_ds = sub.add_parser("add-dataset", help="Add dataset/<label>/ folders")
+    p_ds.add_argument("dataset_dir")
+    sub.add_parser("build-index", help="(Re)build the coarse cluster index")
+    p_search = sub.add_parser("search", help="Nearest labeled images for a photo")
+    p_search.add_argument("image")
+    p_search.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    store = EmbeddingStore(args.store)
+    if args.cmd == "build-index":
+        store.build_index()
+        print(f"✅ Indexed {store.indexed} vectors into {len(store.centroids) if store.centroids is not None else 0} clusters")
+        return
+
+    model = food_model.load_cnn_model(args.model)
+    if model is None:
+        parser.error(f"could not load {args.model}")
+    if getattr(model, "predict_with_features", None) and model.features_output is None:
+        parser.error(f"{args.model} has no pooled-features output; re-export it with tflite_backend.py")
+
+    if args.cmd == "add":
+        store.add(_embed_files(model, args.images), [args.label] * len(args.images), sources=args.images)
+        print(f"✅ Added {len(args.images)} images as '{args.label}'")
+    elif args.cmd == "add-dataset":
+        added = 0
+        for label in sorted(os.listdir(args.dataset_dir)):
+            folder = os.path.join(args.dataset_dir, label)
+            if not os.path.isdir(folder):
+                continue
+            paths = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                           if os.path.splitext(f)[1].lower() in IMAGE_EXTS)
+            if paths:
+                # Same display names as the trained classes ("avacado" -> "Avocado")
+                store.add(_embed_files(model, paths), [label_for_folder(label)] * len(paths), sources=paths)
+                added += len(paths)
+        print(f"✅ Added {added} images, labels: {', '.join(store.known_labels())}")
+    elif args.cmd == "search":
+        vector = _embed_files(model, [args.image])[0]
+        for label, sim, row in store.search(vector, args.k):
+            print(f"{sim:.3f}  {label}  (row {row})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# ------------------------------
+# feature_cache.py
+# Memory-mapped cache of backbone bottleneck features, keyed by file path
+# and mtime, so head-only training skips the MobileNetV2 forward pass.
+# ------------------------------
+
+import json
+import os
+
+import numpy as np
+
+FEATURE_CACHE_DIR = "cache/features"
+
+
+class FeatureCache:
+    """features.npy holds one float32 row per image; index.json maps
+    path -> [mtime_ns, row]. Changed images reuse their row, new ones are
+    appended and the matrix grows by doubling."""
+
+    def __init__(self, cache_dir=FEATURE_CACHE_DIR, dim=1280):
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.matrix_path = os.path.join(cache_dir, "features.npy")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.entries = {}
+        self.count = 0
+        if os.path.exists(self.index_path) and os.path.exists(self.matrix_path):
+            with open(self.index_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("dim") == dim:
+                self.entries = meta["entries"]
+                self.count = meta["count"]
+        if self.count:
+            self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+        else:
+            self.entries = {}
+            self.matrix = np.lib.format.open_memmap(self.matrix_path, mode="w+", dtype=np.float32, shape=(64, dim))
+
+    @staticmethod
+    def _mtime(path):
+        return os.stat(path).st_mtime_ns
+
+    def missing(self, paths):
+        """Paths that are new or changed since their features were cached."""
+        out = []
+        for p in paths:
+            entry = self.entries.get(p)
+            if entry is None or entry[0] != self._mtime(p):
+                out.append(p)
+        return out
+
+    def _grow(self, needed):
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self.matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        grown[:self.count] = self.matrix[:self.count]
+        grown.flush()
+        del grown
+        del self.matrix
+        os.replace(tmp, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+
+    def put(self, paths, features):
+        features = np.asarray(features, dtype=np.float32)
+        new = sum(1 for p in paths if p not in self.entries)
+        self._grow(self.count + new)
+        for p, feat in zip(paths, features):
+            entry = self.entries.get(p)
+            row = entry[1] if entry is not None else self.count
+            if entry is None:
+                self.count += 1
+            self.matrix[row] = feat
+            self.entries[p] = [self._mtime(p), row]
+        self.save()
+
+    def get(self, paths):
+        rows = [self.entries[p][1] for p in paths]
+        return np.asarray(self.matrix[rows])
+
+    def save(self):
+        self.matrix.flush()
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "entries": self.entries}, f)
+        os.replace(tmp, self.index_path)
+
+    def features_for(self, paths, extract_fn):
+        """Cached features for ``paths``, running ``extract_fn(paths)`` only
+        on the new or changed ones."""
+        todo = self.missing(paths)
+        if todo:
+            self.put(todo, extract_fn(todo))
+        return self.get(paths), len(todo)
@@ -0,0 +1,253 @@
+import json
+import os
+import random
+import traceback
+import urllib.request
+import weakref
+import numpy as np
+from preprocessing import MODEL_INPUT_SIZE, resize_for_model, to_model_input
+from metrics import REGISTRY, timed
+from embedding_store import FULL_SPACE, TINY_SPACE
+
+# -------------------------------------------------
+# MODEL CONFIG
+# -------------------------------------------------
+KERAS_MODEL_PATH = "models/custom_food_model.h5"
+# "keras" or "tflite" (quantized export from tflite_backend.py / train_model.py --tflite)
+MODEL_BACKEND = os.environ.get("FOOD_MODEL_BACKEND", "keras")
+TFLITE_MODEL_PATH = os.environ.get("FOOD_TFLITE_MODEL", "models/custom_food_model_int8.tflite")
+TFLITE_THREADS = int(os.environ.get("FOOD_TFLITE_THREADS", "0")) or None  # None = all cores
+MODEL_PATH = TFLITE_MODEL_PATH if MODEL_BACKEND == "tflite" else KERAS_MODEL_PATH
+# Output order of models saved without labels.json (see model_registry.py)
+FOOD_CLASSES = ["Apple", "Burger", "Avocado", "Bread", "Milk", "Pizza"]
+LABELS_FILE = "labels.json"
+IMG_SIZE = MODEL_INPUT_SIZE
+
+# Nearest-neighbour fallback over embedding_store.py
+KNN_FALLBACK_CONFIDENCE = 60.0   # below this the CNN defers to the labeled neighbours
+KNN_OVERRIDE_SIMILARITY = 0.97   # a near-duplicate of a labeled image wins outright
+
+# -------------------------------------------------
+# CNN MODEL LOADING
+# -------------------------------------------------
+def load_cnn_model(path=MODEL_PATH):
+    try:
+        if path.endswith(".tflite"):
+            from tflite_backend import TFLiteModel
+            return TFLiteModel(path, num_threads=TFLITE_THREADS)
+        # Imported here so screens that never run inference don't pay for TensorFlow
+        from tensorflow.keras.models import load_model
+        model = load_model(path)
+        return model
+    except Exception:
+        # Return a dummy model if real model not found
+        return None
+
+def load_classes(path=MODEL_PATH):
+    """Class names in output order, from the labels.json next to the model."""
+    labels = os.path.join(os.path.dirname(path), LABELS_FILE)
+    try:
+        with open(labels) as f:
+            return json.load(f)["classes"]
+    except (OSError, ValueError, KeyError):
+        return FOOD_CLASSES
+
+def warm_up(model):
+    # One dummy forward pass builds the graph so the first real request is fast
+    if model is not None:
+        model.predict_on_batch(np.zeros((1, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32))
+    return model
+
+def model_identity(path=MODEL_PATH):
+    """Which model ``path`` holds, for keying cached answers: the version in
+    its labels.json, else the file's mtime (a file replaced in place is
+    another model)."""
+    try:
+        with open(os.path.join(os.path.dirname(path), LABELS_FILE)) as f:
+            version = json.load(f).get("version")
+    except (OSError, ValueError, AttributeError):
+        version = None
+    if version:
+        return f"{version}/{os.path.basename(path)}"
+    try:
+        return f"{os.path.basename(path)}@{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return "mock"
+
+def load_and_warm_up(path=MODEL_PATH):
+    with timed("model_load"):
+        model = load_cnn_model(path)
+    with timed("model_warmup"):
+        return warm_up(model)
+
+# -------------------------------------------------
+# PREDICTION
+# -------------------------------------------------
+def preprocess_batch(pil_imgs):
+    # One contiguous float32 tensor for the whole batch, filled in place
+    return to_model_input(pil_imgs, IMG_SIZE)
+
+NUTRIENT_FIELDS = ("calories", "carbs_g", "protein_g", "fat_g")
+
+def estimate_nutrition(name, confidence, nutrition=None):
+    row = nutrition.lookup(name) if nutrition is not None else None
+    if row is not None:
+        return {
+            "dish": name,
+            "confidence": confidence,
+            "calories": int(round(row["calories"])),
+            "carbs_g": int(round(row["carbs"])),
+            "protein_g": int(round(row["protein"])),
+            "fat_g": int(round(row["fat"])),
+            "serving_size": row["serving_size"],
+        }
+
+    # No food_data row for this dish: unknown, never a made-up number
+    return dict({field: None for field in NUTRIENT_FIELDS}, dish=name, confidence=confidence, serving_size=None)
+
+def scale_nutrition(result, scale):
+    """The NUTRIENT_FIELDS of a ``scale`` portion, in order; None where unknown."""
+    return tuple(None if result.get(field) is None else int(result[field] * scale) for field in NUTRIENT_FIELDS)
+
+# What the model decided; nutrition is derived from it (see with_nutrition)
+PREDICTION_FIELDS = ("dish", "confidence", "classifier", "embedding_row")
+
+def prediction_only(result):
+    return {k: result[k] for k in PREDICTION_FIELDS if k in result}
+
+def with_nutrition(prediction, nutrition=None):
+    return dict(prediction, **estimate_nutrition(prediction["dish"], prediction["confidence"], nutrition))
+
+def predict_proba_batch(model, pil_imgs, batch_size=32):
+    """Class probabilities, shape (N, len(FOOD_CLASSES))."""
+    x = preprocess_batch(pil_imgs)
+    # Single forward pass; predict_on_batch skips the per-call tf.data setup of predict()
+    if len(x) <= batch_size:
+        return np.asarray(model.predict_on_batch(x))
+    return model.predict(x, batch_size=batch_size, verbose=0)
+
+# Weak keys: a swapped-out model is freed together with its wrapper
+_embedding_models = weakref.WeakKeyDictionary()
+
+def embedding_model(model):
+    """The same network with the pooled features as an extra output."""
+    if model not in _embedding_models:
+        from tensorflow.keras.models import Model
+        _embedding_models[model] = Model(inputs=model.input, outputs=[model.layers[-3].output, model.output])
+    return _embedding_models[model]
+
+def predict_with_embeddings(model, pil_imgs, batch_size=32):
+    """(probabilities, pooled feature vectors) from one forward pass. The
+    vectors are None for a TFLite file exported without the features output."""
+    x = preprocess_batch(pil_imgs)
+    if hasattr(model, "predict_with_features"):
+        # TFLite exports already carry the pooled output
+        features, preds = model.predict_with_features(x)
+        return preds, features
+    m = embedding_model(model)
+    if len(x) <= batch_size:
+        features, preds = m.predict_on_batch(x)
+    else:
+        features, preds = m.predict(x, batch_size=batch_size, verbose=0)
+    return np.asarray(preds), np.asarray(features)
+
+def classify(probs, vector=None, embeddings=None, classes=None, space=FULL_SPACE):
+    """CNN class, or the embedding-store vote when the CNN is unsure."""
+    c = int(np.argmax(probs))
+    name, confidence = (classes or FOOD_CLASSES)[c], float(probs[c]) * 100
+    vote = embeddings.vote(vector, space=space) if embeddings is not None and vector is not None else None
+    if vote is not None:
+        label, share, similarity = vote
+        if similarity >= KNN_OVERRIDE_SIMILARITY or (confidence < KNN_FALLBACK_CONFIDENCE and share * 100 > confidence):
+            return label, share * 100, "knn"
+    return name, confidence, "cnn"
+
+def predict_food_batch(model, pil_imgs, batch_size=32, nutrition=None, embeddings=None, remember=False, tiny=None,
+                       classes=None):
+    """``embeddings`` (an EmbeddingStore) enables the kNN fallback; with
+    ``remember`` each analyzed image is also added to it, unverified.
+    ``tiny`` (a cascade.TinyModel) answers first; only the images it is
+    unsure about reach ``model``. ``classes`` defaults to FOOD_CLASSES."""
+    pil_imgs = list(pil_imgs)
+    classes = classes or FOOD_CLASSES
+    if not pil_imgs:
+        return []
+
+    if model is None:
+        # Mock prediction if model not loaded
+        return [estimate_nutrition(random.choice(classes), random.uniform(85, 98), nutrition) for _ in pil_imgs]
+
+    if tiny is not None:
+        probs, vectors = tiny.predict_images(pil_imgs)
+        keep = tiny.gate(probs)
+        easy = [i for i, k in enumerate(keep) if k]
+        hard = [i for i, k in enumerate(keep) if not k]
+        results = [None] * len(pil_imgs)
+        if easy:
+            # Same kNN fallback / remembering as the full model, within the tiny model's feature space
+            answered = postprocess(probs[easy], vectors[easy] if vectors is not None else None,
+                                   nutrition, embeddings, remember, classes, tier="tiny")
+            for i, r in zip(easy, answered):
+                results[i] = r
+        if hard:
+            with timed("cascade_full"):
+                escalated = predict_food_batch(model, [pil_imgs[i] for i in hard], batch_size,
+                                               nutrition, embeddings, remember, classes=classes)
+            for i, r in zip(hard, escalated):
+                results[i] = r
+        return results
+
+    if embeddings is None:
+        preds, vectors = predict_proba_batch(model, pil_imgs, batch_size), None
+    else:
+        preds, vectors = predict_with_embeddings(model, pil_imgs, batch_size)
+    return postprocess(preds, vectors, nutrition, embeddings, remember, classes)
+
+def postprocess(probs, vectors, nutrition=None, embeddings=None, remember=False, classes=None, tier="cnn"):
+    """Results for one tier's probabilities: kNN fallback and remembering
+    over ``vectors`` in that tier's embedding space (no vectors: CNN only)."""
+    space = TINY_SPACE if tier == "tiny" else FULL_SPACE
+    results = []
+    for i, p in enumerate(probs):
+        v = vectors[i] if vectors is not None else None
+        name, confidence, source = classify(p, v, embeddings, classes, space)
+        results.append(dict(estimate_nutrition(name, confidence, nutrition), classifier=tier if source == "cnn" else source))
+    if remember and embeddings is not None and vectors is not None:
+        try:
+            rows = embeddings.add(vectors, [r["dish"] for r in results], verified=False, space=space)
+        except Exception:
+            # Remembering is a side effect; the predictions stand without it
+            traceback.print_exc()
+            REGISTRY.inc("embedding_store_errors")
+        else:
+            for r, row in zip(results, rows):
+                r["embedding_row"] = row
+    return results
+
+def predict_food(model, pil_img, nutrition=None, embeddings=None, remember=False, tiny=None, classes=None):
+    return predict_food_batch(model, [pil_img], nutrition=nutrition, embeddings=embeddings,
+                              remember=remember, tiny=tiny, classes=classes)[0]
+
+# -------------------------------------------------
+# REMOTE (inference_server.py) CLIENT
+# -------------------------------------------------
+def remote_model_identity(url, timeout=5):
+    """model_identity of the model inference_server.py at ``url`` serves."""
+    with urllib.request.urlopen(url.rstrip("/") + "/health", timeout=timeout) as resp:
+        return json.loads(resp.read()).get("model", "")
+
+def predict_food_remote(url, pil_img, timeout=30):
+    # Resize locally so only model-sized raw pixels cross the socket
+    img = resize_for_model(pil_img, IMG_SIZE)
+    img = img if img.mode == "RGB" else img.convert("RGB")
+    req = urllib.request.Request(
+        url.rstrip("/") + "/predict",
+        data=img.tobytes(),
+        headers={
+            "Content-Type": "application/octet-stream",
+            "X-Image-Size": f"{img.size[0]}x{img.size[1]}",
+        },
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
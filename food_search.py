@@ -0,0 +1,148 @@
+import difflib
+import os
+import sqlite3
+import threading
+
+from nutrition import NUTRITION_DB, normalize_food_name
+
+# -------------------------------------------------
+# SCHEMA (food_calories.db)
+# -------------------------------------------------
+# food_search is an external-content FTS5 table over food_data.name: it
+# stores only the trigram index, the triggers keep it in step with
+# food_data. idx_food_data_name serves prefix lookups shorter than a trigram.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS food_search USING fts5(
+    name, content='food_data', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS food_data_search_ai AFTER INSERT ON food_data BEGIN
+    INSERT INTO food_search (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS food_data_search_ad AFTER DELETE ON food_data BEGIN
+    INSERT INTO food_search (food_search, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS food_data_search_au AFTER UPDATE OF name ON food_data BEGIN
+    INSERT INTO food_search (food_search, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO food_search (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE INDEX IF NOT EXISTS idx_food_data_name ON food_data (name COLLATE NOCASE);
+"""
+
+FUZZY_CANDIDATES = 30  # rows sharing the most trigrams, re-ranked by similarity
+SUBSTRING_CANDIDATES = 50  # first matches of a substring query, shortest names first
+
+def ensure_search_index(db_path=NUTRITION_DB):
+    """Create the FTS table, triggers and name index; build the index from
+    existing rows the first time (create_db.py; the app only reads them)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'food_search'"
+        ).fetchone()
+        conn.executescript(SEARCH_SCHEMA)
+        if not existed:
+            rebuild_search_index(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+def rebuild_search_index(conn):
+    # Re-reads every food_data row; for bulk loads done with the triggers dropped
+    conn.execute("INSERT INTO food_search (food_search) VALUES ('rebuild')")
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+# -------------------------------------------------
+# SEARCH
+# -------------------------------------------------
+class FoodSearch:
+    """Autocomplete over food_data names: prefix, substring, then typo-tolerant.
+    Opens the database read-only; without a usable food_search table (see
+    ensure_search_index) only prefix matches are offered."""
+
+    def __init__(self, db_path=NUTRITION_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self.has_index = False
+        if os.path.exists(db_path):
+            uri = "file:" + os.path.abspath(db_path) + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                # Also fails when this SQLite lacks FTS5 or the trigram tokenizer
+                self._conn.execute("SELECT rowid FROM food_search LIMIT 0").fetchall()
+                self.has_index = True
+            except sqlite3.Error:
+                pass
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def prefix(self, text, limit=10):
+        # Range scan on the NOCASE index: name >= text AND name < text + U+FFFF
+        return self._query(
+            "SELECT id, name, calories, serving_size FROM food_data "
+            "WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE "
+            "ORDER BY name COLLATE NOCASE LIMIT ?",
+            (text, text + "\uffff", limit),
+        )
+
+    def substring(self, text, limit=10):
+        # No bm25 rank: it scores every match of a short query. The closest
+        # of a capped candidate set is the one with least else in its name
+        return self._query(
+            "SELECT f.id, f.name, f.calories, f.serving_size FROM ("
+            "SELECT rowid FROM food_search WHERE food_search MATCH ? LIMIT ?"
+            ") c JOIN food_data f ON f.id = c.rowid ORDER BY length(f.name), f.name LIMIT ?",
+            (_phrase(text), SUBSTRING_CANDIDATES, limit),
+        )
+
+    def fuzzy(self, text, limit=10):
+        # Rows sharing the most trigrams with the query, counted straight off
+        # the per-trigram hits (much cheaper than bm25 over an OR query), then
+        # ordered by overall similarity.
+        grams = sorted(_trigrams(text))
+        if not grams:
+            return []
+        hits = " UNION ALL ".join("SELECT rowid FROM food_search WHERE food_search MATCH ?" for _ in grams)
+        rows = self._query(
+            "SELECT f.id, f.name, f.calories, f.serving_size FROM ("
+            f"SELECT rowid, count(*) AS shared FROM ({hits}) GROUP BY rowid ORDER BY shared DESC LIMIT ?"
+            ") c JOIN food_data f ON f.id = c.rowid",
+            (*[_phrase(g) for g in grams], FUZZY_CANDIDATES),
+        )
+        scored = [(difflib.SequenceMatcher(None, text, normalize_food_name(r[1])).ratio(), r) for r in rows]
+        return [r for score, r in sorted(scored, key=lambda s: -s[0]) if score >= 0.5][:limit]
+
+    def suggest(self, text, limit=8):
+        """Distinct matches, best first: [{id, name, calories, serving_size}]."""
+        text = normalize_food_name(text)
+        if self._conn is None or not text:
+            return []
+        rows = self.prefix(text, limit)
+        if len(text) >= 3 and len(rows) < limit and self.has_index:
+            rows += self.substring(text, limit)
+            if not rows:
+                # Typo-tolerant pass only when nothing matched as typed
+                rows = self.fuzzy(text, limit)
+        seen, results = set(), []
+        for id_, name, calories, serving_size in rows:
+            key = normalize_food_name(name)
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append({"id": id_, "name": name, "calories": calories, "serving_size": serving_size})
+            if len(results) == limit:
+                break
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+HISTORY_DB = "history.db"
+HISTORY_LIMIT = 50  # entries kept per user
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    user TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_user_seq ON history(user, seq);
+CREATE INDEX IF NOT EXISTS idx_history_user_ts ON history(user, timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON history(timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    calories REAL NOT NULL DEFAULT 0,
+    carbs_g REAL NOT NULL DEFAULT 0,
+    protein_g REAL NOT NULL DEFAULT 0,
+    fat_g REAL NOT NULL DEFAULT 0,
+    allergy_hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+"""
+
+ROLLUP_FIELDS = ("entries", "calories", "carbs_g", "protein_g", "fat_g", "allergy_hits")
+
+# Weekly/monthly views are aggregated from the daily rows, never from history.
+# A week is keyed by its Monday, so one spanning New Year stays one bucket.
+PERIOD_KEYS = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 7)",
+}
+
+def user_key(email_or_name):
+    return str(email_or_name or "").strip().casefold()
+
+# -------------------------------------------------
+# HISTORY STORE
+# -------------------------------------------------
+class HistoryStore:
+    """Per-user analysis history in SQLite (WAL mode).
+
+    Every thread gets its own connection, and writes run inside
+    BEGIN IMMEDIATE so concurrent Streamlit sessions serialize cleanly
+    instead of overwriting each other.
+    """
+
+    def __init__(self, db_path=HISTORY_DB, limit=HISTORY_LIMIT):
+        self.db_path = db_path
+        self.limit = limit
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._backfill_rollups()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _insert(conn, user, entry):
+        conn.execute(
+            "INSERT OR REPLACE INTO history (id, user, timestamp, entry) VALUES (?, ?, ?, ?)",
+            (entry["id"], user, str(entry.get("timestamp", "")), json.dumps(entry, default=str)),
+        )
+        HistoryStore._add_to_rollup(conn, user, entry)
+
+    @staticmethod
+    def _add_to_rollup(conn, user, entry, sign=1):
+        # Rollups record what was eaten, so they are not reduced when old
+        # entries are trimmed; only clear() and update() (sign=-1) take away.
+        day = str(entry.get("timestamp", ""))[:10]
+        conn.execute(
+            "INSERT INTO daily_rollup (user, day, entries, calories, carbs_g, protein_g, fat_g, allergy_hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user, day) DO UPDATE SET "
+            "entries = entries + excluded.entries, calories = calories + excluded.calories, "
+            "carbs_g = carbs_g + excluded.carbs_g, protein_g = protein_g + excluded.protein_g, "
+            "fat_g = fat_g + excluded.fat_g, allergy_hits = allergy_hits + excluded.allergy_hits",
+            (
+                user, day, sign,
+                sign * (entry.get("calories") or 0), sign * (entry.get("carbs_g") or 0),
+                sign * (entry.get("protein_g") or 0), sign * (entry.get("fat_g") or 0),
+                sign if entry.get("allergy_detected") else 0,
+            ),
+        )
+
+    def _backfill_rollups(self):
+        # History databases created before rollups existed
+        def op(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_built'").fetchone():
+                return
+            conn.execute("DELETE FROM daily_rollup")
+            for user, entry in conn.execute("SELECT user, entry FROM history ORDER BY seq").fetchall():
+                self._add_to_rollup(conn, user, json.loads(entry))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_built', '1')")
+        self._write(op)
+
+    def _trim(self, conn, user):
+        # Only the rows past the per-user limit are touched, via idx_history_user_seq
+        rows = conn.execute(
+            "SELECT seq, entry FROM history WHERE user = ? ORDER BY seq DESC LIMIT -1 OFFSET ?",
+            (user, self.limit),
+        ).fetchall()
+        if rows:
+            conn.executemany("DELETE FROM history WHERE seq = ?", [(seq,) for seq, _ in rows])
+        return [json.loads(e) for _, e in rows]
+
+    def append(self, entry, user):
+        """Add an entry; returns the entries evicted by the per-user limit."""
+        user = user_key(user)
+
+        def op(conn):
+            self._insert(conn, user, entry)
+            return self._trim(conn, user)
+        return self._write(op)
+
+    def update(self, entry, user):
+        """Replace the stored entry with the same id (e.g. a corrected dish),
+        keeping its place; returns the old entry, or None if it is gone."""
+        user = user_key(user)
+
+        def op(conn):
+            row = conn.execute(
+                "SELECT entry FROM history WHERE id = ? AND user = ?", (entry["id"], user)
+            ).fetchone()
+            if row is None:
+                return None
+            old = json.loads(row[0])
+            conn.execute(
+                "UPDATE history SET timestamp = ?, entry = ? WHERE id = ?",
+                (str(entry.get("timestamp", "")), json.dumps(entry, default=str), entry["id"]),
+            )
+            self._add_to_rollup(conn, user, old, sign=-1)
+            self._add_to_rollup(conn, user, entry)
+            return old
+        return self._write(op)
+
+    def page(self, user, limit=20, offset=0):
+        rows = self._conn().execute(
+            "SELECT entry FROM history WHERE user = ? ORDER BY seq DESC LIMIT ? OFFSET ?",
+            (user_key(user), limit, offset),
+        ).fetchall()
+        return [json.loads(e) for (e,) in rows]
+
+    def between(self, user, start, end):
+        rows = self._conn().execute(
+            "SELECT entry FROM history WHERE user = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (user_key(user), str(start), str(end)),
+        ).fetchall()
+        return [json.loads(e) for (e,) in rows]
+
+    def count(self, user):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM history WHERE user = ?", (user_key(user),)
+        ).fetchone()[0]
+
+    def clear(self, user):
+        """Delete all of a user's entries; returns the removed entries."""
+        user = user_key(user)
+
+        def op(conn):
+            rows = conn.execute("SELECT entry FROM history WHERE user = ?", (user,)).fetchall()
+            conn.execute("DELETE FROM history WHERE user = ?", (user,))
+            conn.execute("DELETE FROM daily_rollup WHERE user = ?", (user,))
+            return [json.loads(e) for (e,) in rows]
+        return self._write(op)
+
+    def rollup(self, user, period="day", start=None, end=None, limit=None):
+        """Totals per day/week/month, oldest first.
+
+        ``start``/``end`` are day strings (YYYY-MM-DD, end exclusive);
+        ``limit`` keeps only the most recent periods.
+        """
+        key = PERIOD_KEYS[period]
+        sql = (
+            f"SELECT {key} AS period, SUM(entries), SUM(calories), SUM(carbs_g), SUM(protein_g), "
+            "SUM(fat_g), SUM(allergy_hits), COUNT(*) FROM daily_rollup WHERE user = ?"
+        )
+        params = [user_key(user)]
+        if start:
+            sql += " AND day >= ?"
+            params.append(str(start))
+        if end:
+            sql += " AND day < ?"
+            params.append(str(end))
+        sql += " GROUP BY period ORDER BY period DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        rows = self._conn().execute(sql, params).fetchall()
+        return [
+            dict(zip(("period",) + ROLLUP_FIELDS + ("days",), row))
+            for row in reversed(rows)
+        ]
+
+    def day_totals(self, user, day):
+        row = self._conn().execute(
+            f"SELECT {', '.join(ROLLUP_FIELDS)} FROM daily_rollup WHERE user = ? AND day = ?",
+            (user_key(user), str(day)),
+        ).fetchone()
+        return dict(zip(ROLLUP_FIELDS, row or (0,) * len(ROLLUP_FIELDS)))
+
+    def migrate_json(self, json_path, resolve_user=None):
+        """One-off import of the legacy history.json list (newest first).
+
+        ``resolve_user`` maps a legacy entry to its user key; legacy entries
+        only carry the display name.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        resolve_user = resolve_user or (lambda e: e.get("user_email") or e.get("user"))
+
+        def op(conn):
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done:
+                return 0
+            try:
+                with open(json_path, "r") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = []
+            # Oldest first so seq order matches the original list order
+            for entry in reversed(entries):
+                entry.setdefault("id", entry.get("timestamp", ""))
+                self._insert(conn, user_key(resolve_user(entry)), entry)
+            for user in {user_key(resolve_user(e)) for e in entries}:
+                self._trim(conn, user)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (json_path,))
+            return len(entries)
+        return self._write(op)
@@ -0,0 +1,149 @@
+import os
+import queue
+import sqlite3
+import threading
+import traceback
+
+from metrics import REGISTRY
+from prediction_cache import content_key
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+HISTORY_IMG_DIR = "history_images"
+DISPLAY_MAX_SIDE = 1024
+THUMB_MAX_SIDE = 192
+DISPLAY_QUALITY = 85
+THUMB_QUALITY = 75
+
+def image_hash(pil_img):
+    # The prediction cache's content key without its "c:" prefix (file names)
+    return content_key(pil_img)[2:]
+
+# -------------------------------------------------
+# IMAGE STORE
+# -------------------------------------------------
+class ImageStore:
+    """Content-addressed history images.
+
+    Each distinct image is stored once as ``<hash>.jpg`` (display size) and
+    ``<hash>_thumb.jpg``. Encoding and deletion happen on one background
+    writer thread, in the order they were requested. A reference count per
+    hash (refs.db) tracks how many history entries use the image; files are
+    deleted when it drops to zero. refs.db may be shared by several app
+    processes: the deletion re-checks the count inside the same write
+    transaction, so an image another process has just referenced again is
+    kept.
+    """
+
+    def __init__(self, root=HISTORY_IMG_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "refs.db"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS refs (hash TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self.errors = 0
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="image-writer", daemon=True)
+        self._writer.start()
+
+    def paths(self, digest):
+        return (os.path.join(self.root, f"{digest}.jpg"),
+                os.path.join(self.root, f"{digest}_thumb.jpg"))
+
+    # ---------------- writer thread ----------------
+    def _run(self):
+        while True:
+            op, digest, img = self._queue.get()
+            try:
+                if op == "write":
+                    self._write_files(digest, img)
+                else:
+                    self._delete_files(digest)
+            except Exception:
+                # Keep the writer alive, but leave a trace of the failed write/delete
+                traceback.print_exc()
+                self.errors += 1
+                REGISTRY.inc("image_store_errors")
+            finally:
+                self._queue.task_done()
+
+    def _write_files(self, digest, img):
+        display_path, thumb_path = self.paths(digest)
+        if os.path.exists(display_path) and os.path.exists(thumb_path):
+            return
+        display = img.copy()
+        display.thumbnail((DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE))
+        thumb = display.copy()
+        thumb.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+        for out, quality, path in ((display, DISPLAY_QUALITY, display_path), (thumb, THUMB_QUALITY, thumb_path)):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            out.save(tmp, "JPEG", quality=quality, optimize=True)
+            os.replace(tmp, path)
+
+    def _delete_files(self, digest):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock: no process can add a
+            # reference between the count check and the unlink
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT count FROM refs WHERE hash = ?", (digest,)).fetchone()
+                if row is not None and row[0] > 0:
+                    self._db.execute("COMMIT")
+                    return
+                for path in self.paths(digest):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._db.execute("DELETE FROM refs WHERE hash = ?", (digest,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # ---------------- public API ----------------
+    def put(self, pil_img):
+        """Register one more reference to ``pil_img`` and return its paths.
+
+        The files are written in the background; the paths are valid as
+        soon as flush() returns or the writer catches up.
+        """
+        img = pil_img if pil_img.mode == "RGB" else pil_img.convert("RGB")
+        digest = image_hash(img)
+        with self._lock:
+            count = self._db.execute(
+                "INSERT INTO refs (hash, count) VALUES (?, 1) "
+                "ON CONFLICT(hash) DO UPDATE SET count = count + 1 RETURNING count",
+                (digest,),
+            ).fetchone()[0]
+            display_path, thumb_path = self.paths(digest)
+            if count == 1 or not os.path.exists(display_path):
+                self._queue.put(("write", digest, img.copy()))
+        return {"img_hash": digest, "img_path": display_path, "thumb_path": thumb_path}
+
+    def release(self, digest):
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE refs SET count = max(count - 1, 0) WHERE hash = ? RETURNING count", (digest,)
+            ).fetchone()
+            if row is not None and row[0] == 0:
+                # The row stays at 0 until the writer has removed the files
+                self._queue.put(("delete", digest, None))
+
+    def release_entry(self, entry):
+        """Drop the image reference held by an evicted/cleared history entry."""
+        if entry.get("img_hash"):
+            self.release(entry["img_hash"])
+        elif entry.get("img_path"):
+            # Pre-ImageStore entries own a uniquely named file
+            try:
+                os.remove(entry["img_path"])
+            except OSError:
+                pass
+
+    def refcount(self, digest):
+        row = self._db.execute("SELECT count FROM refs WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row else 0
+
+    def flush(self):
+        self._queue.join()
@@ -0,0 +1,237 @@
+# ------------------------------
+# import_nutrition.py
+# Bulk-load a nutrition table (CSV, JSON array or JSON lines) into
+# food_data. Rows are upserted on the normalized name, so re-importing a
+# newer release of the same table updates its nutrients in place; the
+# name as first stored is kept.
+#
+#   python import_nutrition.py foods.csv
+#   python import_nutrition.py foods.csv --column calories="Energy (kcal)" --column name=Description
+#   python import_nutrition.py foods.jsonl --chunk-size 20000
+# ------------------------------
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+from food_search import SEARCH_SCHEMA, rebuild_search_index
+from nutrition import NUTRITION_DB, clean_food_name, ensure_food_schema, normalize_food_name
+
+CHUNK_SIZE = 5000  # rows per transaction
+
+FIELDS = ("name", "calories", "protein", "fat", "carbs", "serving_size")
+# Accepted source headers per field, compared case-insensitively
+COLUMN_ALIASES = {
+    "name": ("name", "food", "food_name", "description", "item"),
+    "calories": ("calories", "kcal", "energy_kcal", "energy (kcal)", "energy"),
+    "protein": ("protein", "protein_g", "protein (g)"),
+    "fat": ("fat", "total_fat", "fat_g", "fat (g)", "total lipid (fat)"),
+    "carbs": ("carbs", "carbohydrates", "carbohydrate", "carbs_g", "carbohydrate (g)",
+              "carbohydrate, by difference"),
+    "serving_size": ("serving_size", "serving", "portion", "household_serving"),
+}
+
+UPSERT_SQL = """
+INSERT INTO food_data (name, name_key, calories, protein, fat, carbs, serving_size)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name_key) DO UPDATE SET
+    calories = excluded.calories,
+    protein = excluded.protein,
+    fat = excluded.fat,
+    carbs = excluded.carbs,
+    serving_size = coalesce(excluded.serving_size, serving_size)
+"""
+
+# Secondary structures maintained per row by triggers / index updates.
+# They are dropped for the load and rebuilt once at the end.
+LOAD_DROPPED = (
+    "DROP TRIGGER IF EXISTS food_data_search_ai",
+    "DROP TRIGGER IF EXISTS food_data_search_ad",
+    "DROP TRIGGER IF EXISTS food_data_search_au",
+    "DROP INDEX IF EXISTS idx_food_data_name",
+)
+
+
+# ------------------------------
+# Reading
+# ------------------------------
+def read_records(path):
+    """Stream dict records from .csv, .jsonl/.ndjson or a .json array."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ext == ".json":
+        yield from _json_array(path)
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+
+def _json_array(path, block_size=1 << 20):
+    # Decode one element at a time so a large export never sits in memory whole
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = f.read(block_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array of records")
+        buf, pos, eof = buf[1:], 0, False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(block_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+
+def column_map(headers, overrides=None):
+    """field -> source header, from COLUMN_ALIASES plus explicit overrides."""
+    by_lower = {h.strip().lower(): h for h in headers}
+    mapping = {}
+    for field in FIELDS:
+        for alias in COLUMN_ALIASES[field]:
+            if alias in by_lower:
+                mapping[field] = by_lower[alias]
+                break
+    mapping.update(overrides or {})
+    missing = [f for f in ("name", "calories") if f not in mapping]
+    if missing:
+        raise ValueError(f"no column for {', '.join(missing)} in {', '.join(headers)}")
+    return mapping
+
+def _number(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+def to_row(record, mapping):
+    """A food_data parameter tuple, or None for rows without a name or calories."""
+    name = clean_food_name(record.get(mapping["name"]) or "")
+    calories = _number(record.get(mapping["calories"]))
+    if not name or calories is None or calories < 0:
+        return None
+    serving = clean_food_name(record.get(mapping["serving_size"]) or "") if "serving_size" in mapping else ""
+    return (
+        name,
+        normalize_food_name(name),
+        calories,
+        *(_number(record.get(mapping[f])) if f in mapping else None for f in ("protein", "fat", "carbs")),
+        serving or None,
+    )
+
+
+# ------------------------------
+# Loading
+# ------------------------------
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_records(records, db_path=NUTRITION_DB, overrides=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Upsert ``records`` (dicts) into food_data in ``chunk_size`` transactions.
+    Returns {"read", "upserted", "skipped", "seconds"}."""
+    ensure_food_schema(db_path)
+    stats = {"read": 0, "upserted": 0, "skipped": 0}
+    t0 = time.perf_counter()
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return {**stats, "seconds": 0.0}
+    mapping = column_map(list(first), overrides)
+
+    def rows():
+        for record in itertools.chain([first], records):
+            stats["read"] += 1
+            row = to_row(record, mapping)
+            if row is None:
+                stats["skipped"] += 1
+                continue
+            yield row
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    try:
+        # Load settings: WAL + no fsync per commit. A crash mid-load can lose
+        # the last chunks but never corrupts rows already in the table.
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -65536")  # 64 MB
+        conn.execute("PRAGMA temp_store = MEMORY")
+        for statement in LOAD_DROPPED:
+            conn.execute(statement)
+
+        for chunk in _chunks(rows(), chunk_size):
+            conn.execute("BEGIN")
+            conn.executemany(UPSERT_SQL, chunk)
+            conn.execute("COMMIT")
+            stats["upserted"] += len(chunk)
+            if progress:
+                progress(stats)
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        # Rebuild what was dropped, one pass each; also after a failed load,
+        # since the chunks committed before it are in the table
+        conn.executescript(SEARCH_SCHEMA)
+        rebuild_search_index(conn)
+        conn.execute("ANALYZE food_data")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.close()
+    return {**stats, "seconds": time.perf_counter() - t0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import nutrition data into food_data.")
+    parser.add_argument("files", nargs="+", help=".csv, .json (array) or .jsonl files")
+    parser.add_argument("--db", default=NUTRITION_DB)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=HEADER",
+                        help=f"Source column for a field ({', '.join(FIELDS)}); repeatable")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.column:
+        field, sep, header = item.partition("=")
+        if not sep or field not in FIELDS:
+            parser.error(f"--column expects FIELD=HEADER with FIELD one of {', '.join(FIELDS)}")
+        overrides[field] = header
+
+    for path in args.files:
+        try:
+            stats = import_records(read_records(path), args.db, overrides, args.chunk_size,
+                                   progress=lambda s: print(f"  {s['upserted']:,} rows", end="\r", flush=True))
+        except ValueError as e:
+            parser.error(str(e))
+        rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"✅ {path}: {stats['upserted']:,} rows upserted, {stats['skipped']:,} skipped "
+              f"of {stats['read']:,} in {stats['seconds']:.1f}s ({rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
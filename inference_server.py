@@ -0,0 +1,165 @@
+# ------------------------------
+# inference_server.py
+# One shared model per box: app workers POST images here and requests are
+# coalesced into micro-batches.
+#
+#   python inference_server.py --port 8502 --max-batch 16 --max-wait-ms 10
+#   FOOD_INFERENCE_URL=http://127.0.0.1:8502 streamlit run app.py
+# ------------------------------
+
+import argparse
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+import food_model
+from nutrition import NutritionIndex, NUTRITION_DB
+
+
+# ------------------------------
+# Micro-batching
+# ------------------------------
+class MicroBatcher:
+    """Collects submitted images and runs them through ``predict_batch_fn``
+    in batches of up to ``max_batch_size``, waiting at most ``max_wait_ms``
+    after the first queued image for the batch to fill."""
+
+    def __init__(self, predict_batch_fn, max_batch_size=16, max_wait_ms=10):
+        self.predict_batch_fn = predict_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, pil_img):
+        fut = Future()
+        self._queue.put((pil_img, fut))
+        return fut
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.predict_batch_fn([img for img, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+
+# ------------------------------
+# HTTP handler
+# ------------------------------
+def decode_request_image(body, headers):
+    # Raw RGB pixels from predict_food_remote, or any encoded image file
+    size = headers.get("X-Image-Size")
+    if size:
+        w, h = (int(v) for v in size.split("x"))
+        return Image.frombytes("RGB", (w, h), body)
+    return Image.open(io.BytesIO(body)).convert("RGB")
+
+def make_handler(batcher, timeout=30, model_identity=None):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {
+                    "status": "ok",
+                    "model": model_identity,
+                    "batches": batcher.batches,
+                    "items": batcher.items,
+                    "avg_batch_size": batcher.items / batcher.batches if batcher.batches else 0.0,
+                })
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                img = decode_request_image(body, self.headers)
+            except Exception as e:
+                self._send_json(400, {"error": f"bad image: {e}"})
+                return
+            try:
+                result = batcher.submit(img).result(timeout=timeout)
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return InferenceHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared food-model inference server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--model", default=food_model.MODEL_PATH)
+    parser.add_argument("--nutrition-db", default=NUTRITION_DB)
+    args = parser.parse_args(argv)
+
+    identity = food_model.model_identity(args.model)
+    model = food_model.load_and_warm_up(args.model)
+    if model is None:
+        print(f"⚠ Could not load {args.model}, using mock predictions")
+    nutrition = NutritionIndex(args.nutrition_db)
+    classes = food_model.load_classes(args.model)
+
+    batcher = MicroBatcher(
+        lambda imgs: food_model.predict_food_batch(model, imgs, batch_size=len(imgs), nutrition=nutrition,
+                                                  classes=classes),
+        max_batch_size=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, model_identity=identity))
+    print(f"✅ Inference server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
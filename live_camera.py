@@ -0,0 +1,241 @@
+# ------------------------------
+# live_camera.py
+# Continuous food recognition on a frame stream (webcam or video file).
+#
+#   python live_camera.py --source 0                 # default webcam
+#   python live_camera.py --source meal.mp4          # offline test clip
+#   python live_camera.py --source meal.mp4 --display
+#
+# The model only runs when a cheap 32x32 frame difference says the scene
+# changed, predictions are averaged over the last few inferences of the
+# same scene, and if inference falls behind the reader just overwrites the
+# pending frame.
+# ------------------------------
+
+import argparse
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import food_model
+
+
+# ------------------------------
+# Change detection / smoothing
+# ------------------------------
+class ChangeDetector:
+    """Mean absolute difference (0-255) of a downsampled grayscale frame
+    against the last frame that was sent to the model.
+
+    ``new_scene`` is set when a changed frame also differs from the first
+    frame of the current scene by more than ``scene_threshold``: a different
+    dish rather than movement, so earlier predictions no longer apply.
+    """
+
+    def __init__(self, threshold=8.0, size=(32, 32), scene_threshold=None):
+        self.threshold = threshold
+        self.scene_threshold = scene_threshold or 3 * threshold
+        self.size = size
+        self.reference = None
+        self.scene = None
+        self.new_scene = False
+
+    def thumbnail(self, frame_bgr):
+        small = cv2.resize(frame_bgr, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def changed(self, frame_bgr):
+        thumb = self.thumbnail(frame_bgr)
+        self.new_scene = False
+        if self.reference is None or np.abs(thumb - self.reference).mean() > self.threshold:
+            self.reference = thumb
+            if self.scene is None or np.abs(thumb - self.scene).mean() > self.scene_threshold:
+                self.scene = thumb
+                self.new_scene = True
+            return True
+        return False
+
+class PredictionSmoother:
+    def __init__(self, window=5):
+        self.recent = deque(maxlen=window)
+
+    def add(self, probs):
+        self.recent.append(np.asarray(probs, dtype=np.float32))
+        mean = np.mean(self.recent, axis=0)
+        c = int(np.argmax(mean))
+        return c, float(mean[c])
+
+    def reset(self):
+        self.recent.clear()
+
+
+# ------------------------------
+# Pipeline
+# ------------------------------
+class LatestFrame:
+    """Single-slot mailbox: a new frame replaces an unconsumed one."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._new_scene = False
+        self.dropped = 0
+
+    def put(self, frame, new_scene=False):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            # A scene change survives its frame being overwritten
+            self._new_scene = self._new_scene or new_scene
+            self._cond.notify()
+
+    def take(self, timeout=0.5):
+        """(frame, new_scene); frame is None on timeout."""
+        with self._cond:
+            if self._frame is None:
+                self._cond.wait(timeout)
+            frame, self._frame = self._frame, None
+            new_scene = self._new_scene and frame is not None
+            if frame is not None:
+                self._new_scene = False
+            return frame, new_scene
+
+class LiveClassifier:
+    def __init__(self, model, classes=None, change_threshold=8.0, smooth_window=5):
+        self.model = model
+        self.classes = classes or food_model.FOOD_CLASSES
+        self.detector = ChangeDetector(change_threshold)
+        self.smoother = PredictionSmoother(smooth_window)
+        self.mailbox = LatestFrame()
+        self.frames = 0
+        self.skipped = 0
+        self.inferred = 0
+        self.current = None  # (dish, confidence) after smoothing
+        self._stop = threading.Event()
+
+    def probabilities(self, frame_bgr):
+        img = Image.fromarray(np.ascontiguousarray(frame_bgr[:, :, ::-1]))
+        if self.model is None:
+            # Deterministic mock so the loop can be exercised without a model
+            p = np.full(len(self.classes), 0.1 / max(1, len(self.classes) - 1), dtype=np.float32)
+            p[int(np.asarray(img.resize((8, 8))).mean()) % len(self.classes)] = 0.9
+            return p
+        return food_model.predict_proba_batch(self.model, [img])[0]
+
+    def _inference_loop(self, on_prediction):
+        while not self._stop.is_set():
+            frame, new_scene = self.mailbox.take()
+            if frame is None:
+                continue
+            if new_scene:
+                # Otherwise the old dish's inferences outvote the first one of the new dish
+                self.smoother.reset()
+            c, conf = self.smoother.add(self.probabilities(frame))
+            self.inferred += 1
+            self.current = (self.classes[c], conf * 100)
+            if on_prediction:
+                on_prediction(*self.current)
+
+    def offer(self, frame_bgr):
+        """Called for every captured frame; cheap unless the scene changed."""
+        self.frames += 1
+        if self.detector.changed(frame_bgr):
+            # A copy: the caller may draw on or reuse the frame it passed in
+            self.mailbox.put(frame_bgr.copy(), self.detector.new_scene)
+        else:
+            self.skipped += 1
+
+    def run(self, capture, pace_fps=None, on_prediction=None, on_frame=None):
+        worker = threading.Thread(target=self._inference_loop, args=(on_prediction,), daemon=True)
+        worker.start()
+        interval = 1.0 / pace_fps if pace_fps else 0.0
+        next_t = time.perf_counter()
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.offer(frame)
+                if on_frame and on_frame(frame, self.current) is False:
+                    break
+                if interval:
+                    # Replay files at their native rate so dropping behaves as it would live
+                    next_t += interval
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            time.sleep(0.1)
+            self._stop.set()
+            worker.join(timeout=2)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped_unchanged": self.skipped,
+            "dropped_busy": self.mailbox.dropped,
+            "inferred": self.inferred,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live food recognition on a camera or video stream.")
+    parser.add_argument("--source", default="0", help="Camera index or video file path")
+    parser.add_argument("--threshold", type=float, default=8.0, help="Scene-change threshold (mean abs diff, 0-255)")
+    parser.add_argument("--smooth", type=int, default=5, help="Inferences averaged per prediction")
+    parser.add_argument("--fps", type=float, help="Replay rate for video files (default: the file's own FPS)")
+    parser.add_argument("--display", action="store_true", help="Show the stream with the current prediction")
+    parser.add_argument("--model", default=food_model.MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        parser.error(f"cannot open source: {args.source}")
+    pace = None
+    if not isinstance(source, int):
+        pace = args.fps or capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    model = food_model.load_and_warm_up(args.model)
+    if model is None:
+        print(f"⚠ Could not load {args.model}, using mock predictions")
+    live = LiveClassifier(model, food_model.load_classes(args.model), change_threshold=args.threshold, smooth_window=args.smooth)
+
+    last = [None]
+    def on_prediction(dish, confidence):
+        if dish != last[0]:
+            last[0] = dish
+            print(f"🍽 {dish} ({confidence:.1f}%)")
+
+    def on_frame(frame, current):
+        if not args.display:
+            return True
+        if current:
+            cv2.putText(frame, f"{current[0]} {current[1]:.0f}%", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
+        cv2.imshow("Food Calorie Estimator - live", frame)
+        return (cv2.waitKey(1) & 0xFF) != ord("q")
+
+    t0 = time.perf_counter()
+    try:
+        live.run(capture, pace_fps=pace, on_prediction=on_prediction, on_frame=on_frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+        if args.display:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - t0
+    stats = live.stats()
+    print(f"✅ {stats['frames']} frames in {elapsed:.1f}s ({stats['frames'] / max(elapsed, 1e-9):.1f} fps): "
+          f"{stats['inferred']} inferred, {stats['skipped_unchanged']} unchanged, {stats['dropped_busy']} dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RESERVOIR_SIZE = 2048  # recent samples kept per stage for p50/p95/p99
+
+# -------------------------------------------------
+# HISTOGRAM
+# -------------------------------------------------
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)):
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return {q: None for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+# -------------------------------------------------
+# REGISTRY
+# -------------------------------------------------
+class MetricsRegistry:
+    def __init__(self, prefix="food"):
+        self.prefix = prefix
+        self.stages = {}
+        self.counters = {}
+        self.counter_fns = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        hist = self.stages.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.stages.setdefault(name, Histogram())
+        return hist
+
+    def observe(self, stage, seconds):
+        self.stage(stage).observe(seconds)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_gauge(self, name, fn):
+        """``fn`` is called at export time, e.g. to read a cache's hit rate."""
+        self.gauges[name] = fn
+
+    def register_counter(self, name, fn):
+        """Like register_gauge, for a cumulative count kept elsewhere (a cache's hits)."""
+        self.counter_fns[name] = fn
+
+    def snapshot(self):
+        rows = []
+        for name, hist in sorted(self.stages.items()):
+            p = hist.percentiles()
+            rows.append({
+                "stage": name,
+                "count": hist.count,
+                "p50_ms": p[0.5] * 1000 if p[0.5] is not None else None,
+                "p95_ms": p[0.95] * 1000 if p[0.95] is not None else None,
+                "p99_ms": p[0.99] * 1000 if p[0.99] is not None else None,
+                "total_s": hist.sum,
+            })
+        return rows
+
+    def render_prometheus(self):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Latency of each analyze-pipeline stage.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for name, hist in sorted(self.stages.items()):
+            with hist._lock:
+                counts, total, count = list(hist.counts), hist.sum, hist.count
+            cumulative = 0
+            for bound, c in zip(hist.buckets, counts):
+                cumulative += c
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {count}')
+
+        lines.append(f"# HELP {p}_stage_seconds_quantile Recent-sample quantiles per stage.")
+        lines.append(f"# TYPE {p}_stage_seconds_quantile gauge")
+        for name, hist in sorted(self.stages.items()):
+            for q, v in hist.percentiles().items():
+                if v is not None:
+                    lines.append(f'{p}_stage_seconds_quantile{{stage="{name}",quantile="{q}"}} {v}')
+
+        counters = dict(self.counters)
+        for name, fn in self.counter_fns.items():
+            try:
+                counters[name] = float(fn())
+            except Exception:
+                continue
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+@contextmanager
+def timed(stage, registry=REGISTRY):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - t0)
+
+# -------------------------------------------------
+# /metrics ENDPOINT
+# -------------------------------------------------
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics on a daemon thread; None if the port can't be bound
+    (e.g. another app process already serves it)."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"⚠ Metrics endpoint not started on {host}:{port}: {e}", file=sys.stderr)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
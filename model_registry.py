@@ -0,0 +1,168 @@
+# ------------------------------
+# model_registry.py
+# Versioned models: train_model.py publishes models/versions/<timestamp>/
+# (model.h5, labels.json, optional TFLite and tiny cascade files) and the
+# app swaps to the newest version without a restart.
+# ------------------------------
+
+import json
+import os
+import shutil
+import threading
+import traceback
+from collections import namedtuple
+from datetime import datetime
+
+import food_model
+from cascade import TinyModel, calibration_path
+
+MODEL_VERSIONS_DIR = "models/versions"
+POLL_INTERVAL = 10.0  # seconds between checks for a new version
+
+# Version file names
+KERAS_FILE = "model.h5"
+TFLITE_FILES = ("model_int8.tflite", "model_float16.tflite")
+TINY_FILE = "tiny_model.h5"  # with tiny_model.json and optional tiny_model_<mode>.tflite
+
+# Dataset folder names that are not the dish name
+FOLDER_LABELS = {"avacado": "Avocado"}
+
+def label_for_folder(folder):
+    return FOLDER_LABELS.get(folder.lower(), folder.replace("_", " ").title())
+
+def classes_from_indices(class_indices):
+    """Display names in model-output order from train_model's class_indices."""
+    return [label_for_folder(f) for f, _ in sorted(class_indices.items(), key=lambda item: item[1])]
+
+def write_labels(directory, classes, **meta):
+    with open(os.path.join(directory, food_model.LABELS_FILE), "w") as f:
+        json.dump({"classes": list(classes), **meta}, f, indent=2)
+
+
+# ------------------------------
+# Publishing
+# ------------------------------
+def publish_version(files, classes, root=MODEL_VERSIONS_DIR, **meta):
+    """Copy ``files`` ({name in the version: source path}) and labels.json
+    into a new version folder. The folder is renamed into place only when
+    complete, so a watcher never sees half a version."""
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f".{name}.tmp")
+    os.makedirs(staging)
+    for target, source in files.items():
+        shutil.copy2(source, os.path.join(staging, target))
+    write_labels(staging, classes, version=name, **meta)
+    final = os.path.join(root, name)
+    os.rename(staging, final)
+    return final
+
+def list_versions(root=MODEL_VERSIONS_DIR):
+    """Complete version folders, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        d for d in os.listdir(root)
+        if not d.startswith(".") and os.path.exists(os.path.join(root, d, food_model.LABELS_FILE))
+    )
+
+def version_model_path(version_dir):
+    if food_model.MODEL_BACKEND == "tflite":
+        for name in TFLITE_FILES:
+            if os.path.exists(os.path.join(version_dir, name)):
+                return os.path.join(version_dir, name)
+    return os.path.join(version_dir, KERAS_FILE)
+
+
+# ------------------------------
+# Hot reload
+# ------------------------------
+# identity: food_model.model_identity of the loaded file, taken before loading
+ModelVersion = namedtuple("ModelVersion", "name model classes tiny identity")
+
+def load_version(version_dir):
+    """Load and warm up everything in a version folder."""
+    path = version_model_path(version_dir)
+    identity = food_model.model_identity(path)
+    model = food_model.load_and_warm_up(path)
+    if model is None:
+        raise RuntimeError(f"could not load {path}")
+    tiny_path = os.path.join(version_dir, TINY_FILE)
+    return ModelVersion(
+        name=os.path.basename(version_dir),
+        model=model,
+        classes=food_model.load_classes(path),
+        tiny=TinyModel.load(tiny_path) if os.path.exists(calibration_path(tiny_path)) else None,
+        identity=identity,
+    )
+
+def load_unversioned(path=food_model.MODEL_PATH):
+    # The plain models/ files, for installs that predate versioning
+    identity = food_model.model_identity(path)
+    return ModelVersion(
+        name=None,
+        model=food_model.load_and_warm_up(path),
+        classes=food_model.load_classes(path),
+        tiny=TinyModel.load(),
+        identity=identity,
+    )
+
+class ModelRegistry:
+    """Holds the current ModelVersion and replaces it when a newer version
+    folder appears. Loading and warm-up happen on a background thread;
+    the swap is a single reference assignment, so a request that already
+    took ``current()`` finishes on the model it started with."""
+
+    def __init__(self, root=MODEL_VERSIONS_DIR, poll_interval=POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.failed = set()
+        self.swaps = 0
+        self._current = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def current(self, timeout=None):
+        """The live ModelVersion; waits for the first load."""
+        self._ready.wait(timeout)
+        return self._current
+
+    def _newest(self):
+        versions = [v for v in list_versions(self.root) if v not in self.failed]
+        return versions[-1] if versions else None
+
+    def check(self):
+        """Load the newest version if it is not the live one; True when it went live."""
+        newest = self._newest()
+        current = self._current
+        if newest is None or (current is not None and current.name is not None and newest <= current.name):
+            return False
+        try:
+            loaded = load_version(os.path.join(self.root, newest))
+        except Exception:
+            # Keep serving the old version; don't retry a broken folder every poll
+            traceback.print_exc()
+            self.failed.add(newest)
+            return False
+        previous, self._current = self._current, loaded
+        if previous is not None:
+            self.swaps += 1
+        return True
+
+    def _run(self):
+        try:
+            if not self.check():
+                self._current = load_unversioned()
+        finally:
+            self._ready.set()
+        while not self._stop.wait(self.poll_interval):
+            self.check()
@@ -0,0 +1,162 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+NUTRITION_DB = "database/food_calories.db"
+
+# Model class name -> food_data row name, for classes whose label differs
+NAME_ALIASES = {
+    "pizza": "pizza slice",
+}
+
+def normalize_food_name(name):
+    name = re.sub(r"\s+", " ", str(name).strip().lower())
+    return name
+
+def base_food_name(name):
+    # "rice (cooked)" -> "rice"
+    return re.sub(r"\s*\(.*?\)\s*", " ", name).strip()
+
+# -------------------------------------------------
+# SCHEMA (food_calories.db)
+# -------------------------------------------------
+FOOD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS food_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL,
+    fat REAL,
+    carbs REAL,
+    serving_size TEXT,
+    name_key TEXT
+);
+"""
+# name_key is normalize_food_name(name), written by every insert; it is what
+# imports upsert on. Not a generated column: SQLite's lower() folds ASCII only.
+NAME_KEY_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS ux_food_data_name_key ON food_data (name_key)"
+
+def clean_food_name(name):
+    return " ".join(str(name).split())
+
+def ensure_food_schema(db_path=NUTRITION_DB):
+    """Create food_data, or bring an older one up to date: rows without a
+    name_key get one, and duplicate names are merged (the first row wins)
+    before the unique name_key index is built."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(FOOD_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(food_data)")}
+        with conn:
+            if "name_key" not in columns:
+                conn.execute("ALTER TABLE food_data ADD COLUMN name_key TEXT")
+            seen = {key for key, in conn.execute("SELECT name_key FROM food_data WHERE name_key IS NOT NULL")}
+            duplicates, keyed = [], []
+            for id_, name in conn.execute("SELECT id, name FROM food_data WHERE name_key IS NULL ORDER BY id").fetchall():
+                key = normalize_food_name(name)
+                if key in seen:
+                    duplicates.append((id_,))
+                else:
+                    keyed.append((clean_food_name(name), key, id_))
+                seen.add(key)
+            conn.executemany("DELETE FROM food_data WHERE id = ?", duplicates)
+            conn.executemany("UPDATE food_data SET name = ?, name_key = ? WHERE id = ?", keyed)
+        conn.execute(NAME_KEY_INDEX)
+        conn.commit()
+    finally:
+        conn.close()
+
+# -------------------------------------------------
+# NUTRITION INDEX
+# -------------------------------------------------
+class NutritionIndex:
+    """In-memory map of food_data, loaded once and reloaded when the DB file changes."""
+
+    def __init__(self, db_path=NUTRITION_DB, aliases=None, check_interval=2.0):
+        self.db_path = db_path
+        self.aliases = {normalize_food_name(k): normalize_food_name(v)
+                        for k, v in (NAME_ALIASES if aliases is None else aliases).items()}
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._rows = {}
+        self._signature = None
+        self._next_check = 0.0
+        self.reload()
+
+    def _file_signature(self):
+        sig = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _connect(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if os.path.exists(self.db_path):
+            uri = "file:" + os.path.abspath(self.db_path) + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def reload(self):
+        with self._lock:
+            # Reconnect too, in case the file was replaced rather than updated
+            self._connect()
+            rows = {}
+            if self._conn is not None:
+                try:
+                    cur = self._conn.execute(
+                        "SELECT name, calories, protein, fat, carbs, serving_size FROM food_data ORDER BY id"
+                    )
+                except sqlite3.Error:
+                    cur = []
+                for name, calories, protein, fat, carbs, serving_size in cur:
+                    row = {
+                        "name": name,
+                        "calories": calories,
+                        "protein": protein or 0.0,
+                        "fat": fat or 0.0,
+                        "carbs": carbs or 0.0,
+                        "serving_size": serving_size,
+                    }
+                    key = normalize_food_name(name)
+                    rows[key] = row
+                    rows.setdefault(base_food_name(key), row)
+            self._rows = rows
+            self._signature = self._file_signature()
+            self._next_check = time.monotonic() + self.check_interval
+
+    def _refresh_if_changed(self):
+        # Stat the file at most once per check_interval, not on every lookup
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self._file_signature() != self._signature:
+            self.reload()
+
+    def lookup(self, name):
+        self._refresh_if_changed()
+        key = normalize_food_name(name)
+        rows = self._rows
+        row = rows.get(self.aliases.get(key, key)) or rows.get(key)
+        return dict(row) if row else None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,113 @@
+import numpy as np
+
+import food_model
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+# Window sizes, in feature-map cells (MobileNetV2 gives a 7x7 map at 224px).
+# 4 -> 2x2 overlapping quadrants, 3 -> 3x3 grid of smaller regions.
+WINDOW_SIZES = (4, 3)
+MIN_ITEM_CONFIDENCE = 0.60
+
+# -------------------------------------------------
+# PLATE ANALYZER
+# -------------------------------------------------
+class PlateAnalyzer:
+    """Classifies several regions of one image from a single backbone pass.
+
+    The saved model is base -> GlobalAveragePooling2D -> Dense(128) -> softmax.
+    We run the model up to the pooling layer once to get the spatial feature
+    map, average-pool sub-windows of it (via a summed-area table, so every
+    window is O(1)) and push all pooled vectors through the Dense head as one
+    small numpy matmul.
+    """
+
+    def __init__(self, model, classes=None, window_sizes=WINDOW_SIZES, min_confidence=MIN_ITEM_CONFIDENCE):
+        self.model = model
+        self.classes = classes or food_model.FOOD_CLASSES
+        self.window_sizes = window_sizes
+        self.min_confidence = min_confidence
+        if model is not None:
+            from tensorflow.keras.models import Model
+            pool, hidden, out = model.layers[-3], model.layers[-2], model.layers[-1]
+            self.feature_model = Model(inputs=model.input, outputs=pool.input)
+            self.w1, self.b1 = hidden.get_weights()
+            self.w2, self.b2 = out.get_weights()
+
+    def windows(self, h, w):
+        yield 0, 0, h, w
+        for size in self.window_sizes:
+            if size >= min(h, w):
+                continue
+            # ceil(h / size) windows per axis, spread evenly with overlap
+            step_y = max(1, (h - size) // max(1, -(-h // size) - 1))
+            step_x = max(1, (w - size) // max(1, -(-w // size) - 1))
+            for y in range(0, h - size + 1, step_y):
+                for x in range(0, w - size + 1, step_x):
+                    yield y, x, y + size, x + size
+
+    def pooled_regions(self, fmap):
+        h, w, c = fmap.shape
+        # Summed-area table with a zero row/column in front
+        sat = np.zeros((h + 1, w + 1, c), dtype=np.float64)
+        sat[1:, 1:] = fmap.cumsum(axis=0).cumsum(axis=1)
+        boxes = list(self.windows(h, w))
+        pooled = np.empty((len(boxes), c), dtype=np.float32)
+        for i, (y0, x0, y1, x1) in enumerate(boxes):
+            total = sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+            pooled[i] = total / ((y1 - y0) * (x1 - x0))
+        return boxes, pooled
+
+    def head(self, pooled):
+        hidden = np.maximum(pooled @ self.w1 + self.b1, 0.0)
+        logits = hidden @ self.w2 + self.b2
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    def detect(self, pil_img):
+        """Returns [(class_name, confidence, (x0, y0, x1, y1) as fractions)], best first."""
+        x = food_model.preprocess_batch([pil_img])
+        fmap = np.asarray(self.feature_model.predict_on_batch(x))[0]
+        h, w = fmap.shape[:2]
+        boxes, pooled = self.pooled_regions(fmap)
+        probs = self.head(pooled)
+
+        # Best confident window per class; fall back to the whole image (index 0)
+        best = {}
+        for i, (box, p) in enumerate(zip(boxes, probs)):
+            c = int(np.argmax(p))
+            conf = float(p[c])
+            if conf < self.min_confidence:
+                continue
+            if c not in best or conf > best[c][0]:
+                best[c] = (conf, box)
+        if not best:
+            c = int(np.argmax(probs[0]))
+            best[c] = (float(probs[0][c]), boxes[0])
+        best = {c: (conf, (x0 / w, y0 / h, x1 / w, y1 / h)) for c, (conf, (y0, x0, y1, x1)) in best.items()}
+        items = [(self.classes[c], conf, box) for c, (conf, box) in best.items()]
+        return sorted(items, key=lambda item: -item[1])
+
+    def analyze(self, pil_img, nutrition=None):
+        if self.model is None:
+            single = food_model.predict_food(None, pil_img, nutrition=nutrition)
+            items = [dict(single, box=(0.0, 0.0, 1.0, 1.0))]
+        else:
+            items = [
+                dict(food_model.estimate_nutrition(name, conf * 100, nutrition), box=box)
+                for name, conf, box in self.detect(pil_img)
+            ]
+        return combine_items(items)
+
+
+def combine_items(items):
+    """Plate result in the predict_food schema, with the per-dish items attached."""
+    return {
+        "dish": " + ".join(i["dish"] for i in items),
+        "confidence": min(i["confidence"] for i in items),
+        # Unknown for the plate when any dish's nutrition is unknown
+        **{field: None if any(i[field] is None for i in items) else sum(i[field] for i in items)
+           for field in food_model.NUTRIENT_FIELDS},
+        "items": items,
+    }
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+# -------------------------------------------------
+# IMAGE KEYS
+# -------------------------------------------------
+def content_key(pil_img):
+    # Hash of the decoded pixels, so re-encoded copies of the same photo still hit
+    h = hashlib.sha256()
+    h.update(f"{pil_img.mode}:{pil_img.size[0]}x{pil_img.size[1]}:".encode())
+    h.update(pil_img.tobytes())
+    return "c:" + h.hexdigest()
+
+def perceptual_hash(pil_img, hash_size=8):
+    # dHash: compare neighbouring pixels of a tiny grayscale thumbnail
+    small = pil_img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = px[row * (hash_size + 1) + col]
+            right = px[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+def perceptual_key(pil_img):
+    return "p:%016x" % perceptual_hash(pil_img)
+
+# -------------------------------------------------
+# PREDICTION CACHE
+# -------------------------------------------------
+class PredictionCache:
+    """LRU cache of prediction results keyed by image content and by a
+    ``namespace`` naming the model that produced them.
+
+    With ``perceptual=True`` keys are 64-bit dHashes and a lookup also hits
+    any cached image within ``max_distance`` bits. ``disk_path`` adds a
+    SQLite tier that survives restarts.
+    """
+
+    def __init__(self, max_entries=512, disk_path=None, max_disk_entries=50000,
+                 perceptual=False, max_distance=4):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_predictions_last_used ON predictions(last_used)")
+            self._db.commit()
+
+    def key(self, pil_img, namespace=None):
+        key = perceptual_key(pil_img) if self.perceptual else content_key(pil_img)
+        return f"{namespace}/{key}" if namespace else key
+
+    def _near_key(self, key):
+        # Only within the same namespace: another model's answer is no hit
+        prefix, _, bits = key.rpartition(":")
+        target = int(bits, 16)
+        best, best_dist = None, self.max_distance + 1
+        for k in self._mem:
+            k_prefix, _, k_bits = k.rpartition(":")
+            if k_prefix != prefix:
+                continue
+            dist = bin(int(k_bits, 16) ^ target).count("1")
+            if dist < best_dist:
+                best, best_dist = k, dist
+        return best
+
+    def _remember(self, key, result):
+        self._mem[key] = result
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def lookup(self, key):
+        with self._lock:
+            if key not in self._mem and self.perceptual:
+                key = self._near_key(key) or key
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return dict(self._mem[key])
+
+            if self._db is not None:
+                row = self._db.execute("SELECT result FROM predictions WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._db.execute("UPDATE predictions SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def store(self, key, result):
+        with self._lock:
+            self._remember(key, dict(result))
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO predictions (key, result, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(result), time.time()),
+            )
+            self._puts += 1
+            # Trim the disk tier now and then rather than on every write
+            if self._puts % 100 == 0:
+                self._db.execute(
+                    "DELETE FROM predictions WHERE key IN ("
+                    "SELECT key FROM predictions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+            self._db.commit()
+
+    def get_or_predict(self, pil_img, predict_fn, namespace=None):
+        key = self.key(pil_img, namespace)
+        result = self.lookup(key)
+        if result is None:
+            result = predict_fn(pil_img)
+            self.store(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,102 @@
+# ------------------------------
+# preprocessing.py
+# Image decode + model-input preparation.
+#
+#   python preprocessing.py --bench rt.jpg background.jpg
+# ------------------------------
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+MODEL_INPUT_SIZE = (224, 224)
+
+
+# ------------------------------
+# Decoding
+# ------------------------------
+def open_image(fp, max_side=None):
+    """Decode an image file as upright RGB.
+
+    For JPEGs, ``max_side`` lets libjpeg decode at 1/2, 1/4 or 1/8 scale
+    (draft mode) as long as both sides stay >= max_side, so a 12 MP photo
+    never gets decoded at full resolution.
+    """
+    img = Image.open(fp)
+    if max_side:
+        img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+def resize_for_model(img, size=MODEL_INPUT_SIZE):
+    if img.size == size:
+        return img
+    # reducing_gap does a cheap integer box-reduce first, then a small bilinear resize
+    return img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+def load_for_model(fp, size=MODEL_INPUT_SIZE):
+    return resize_for_model(open_image(fp, max_side=max(size)), size)
+
+
+# ------------------------------
+# Model input
+# ------------------------------
+def to_model_input(pil_imgs, size=MODEL_INPUT_SIZE, out=None):
+    """Pack images into one contiguous float32 (N, H, W, 3) tensor scaled to [0, 1].
+
+    Each image's uint8 pixels are scaled straight into its slot of ``out``;
+    there is no float64 intermediate and no per-image array to concatenate.
+    """
+    if out is None:
+        out = np.empty((len(pil_imgs), size[1], size[0], 3), dtype=np.float32)
+    for i, img in enumerate(pil_imgs):
+        img = resize_for_model(img, size)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        np.multiply(np.asarray(img, dtype=np.uint8), np.float32(1.0 / 255.0), out=out[i], casting="unsafe")
+    return out
+
+
+# ------------------------------
+# Benchmark
+# ------------------------------
+def legacy_path(path):
+    # What app.py + predict_food did before: full decode, default resize, float64
+    img = Image.open(path).convert("RGB")
+    x = np.array(img.resize(MODEL_INPUT_SIZE))
+    x = np.expand_dims(x, axis=0)
+    return x / 255.0
+
+def fast_path(path):
+    return to_model_input([load_for_model(path)])
+
+def bench(fn, path, repeat):
+    fn(path)  # warm file cache
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(path)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing paths.")
+    parser.add_argument("--bench", nargs="+", required=True, metavar="IMAGE")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    for path in args.bench:
+        with Image.open(path) as img:
+            size = img.size
+        legacy = bench(legacy_path, path, args.repeat)
+        fast = bench(fast_path, path, args.repeat)
+        diff = float(np.abs(legacy_path(path)[0] - fast_path(path)[0]).mean())
+        print(f"{path} {size[0]}x{size[1]}: legacy {legacy:.1f} ms, fast {fast:.1f} ms "
+              f"({legacy / fast:.1f}x), mean abs pixel diff {diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# ------------------------------
+# score_images.py
+# Headless bulk scorer: walks an image directory and streams predictions
+# to JSONL or CSV.
+#
+#   python score_images.py dataset --output scores.jsonl --workers 8
+#   python score_images.py exports/ --output scores.csv --resume
+# ------------------------------
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import food_model
+from preprocessing import load_for_model
+from nutrition import NutritionIndex, NUTRITION_DB
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+CSV_FIELDS = ["path", "dish", "confidence", "calories", "carbs_g", "protein_g", "fat_g", "serving_size", "error"]
+
+
+# ------------------------------
+# Input discovery / decoding
+# ------------------------------
+def iter_image_paths(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for fname in sorted(filenames):
+            if os.path.splitext(fname)[1].lower() in IMAGE_EXTS:
+                yield os.path.join(dirpath, fname)
+
+def decode_image(path):
+    # Decode straight to model resolution so queued images stay small
+    try:
+        return path, load_for_model(path, food_model.IMG_SIZE), None
+    except Exception as e:
+        return path, None, str(e)
+
+def decoded_images(paths, workers, window):
+    # Keep at most `window` decodes in flight so memory stays bounded
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(decode_image, path))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ------------------------------
+# Output
+# ------------------------------
+def output_format(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def load_done_paths(path, fmt):
+    """Paths already scored; images that failed to decode are retried."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                if not row.get("error"):
+                    done.add(row["path"])
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if "path" in row and not row.get("error"):
+                    done.add(row["path"])
+    return done
+
+def truncate_partial_line(path, block_size=4096):
+    # An interrupted run can leave the last row half written; cut it off so
+    # appended rows start on a fresh line
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            block = f.read(pos - start)
+            if pos == end and block.endswith(b"\n"):
+                return
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+class ResultWriter:
+    def __init__(self, path, fmt, append):
+        is_new = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.fmt = fmt
+        self.f = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        if fmt == "csv":
+            self.writer = csv.DictWriter(self.f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            if is_new:
+                self.writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.fmt == "csv":
+                self.writer.writerow(row)
+            else:
+                self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+# ------------------------------
+# Scoring loop
+# ------------------------------
+def score_batch(model, batch, nutrition=None, classes=None):
+    results = food_model.predict_food_batch(model, [img for _, img in batch], batch_size=len(batch),
+                                            nutrition=nutrition, classes=classes)
+    return [dict(path=path, **res) for (path, _), res in zip(batch, results)]
+
+def score_directory(model, root, output, fmt=None, batch_size=32, workers=4, resume=False, nutrition=None,
+                    classes=None):
+    fmt = output_format(output, fmt)
+    if resume:
+        truncate_partial_line(output)
+    done = load_done_paths(output, fmt) if resume else set()
+    paths = (p for p in iter_image_paths(root) if p not in done)
+
+    writer = ResultWriter(output, fmt, append=resume)
+    scored = failed = 0
+    batch = []
+    try:
+        for path, img, err in decoded_images(paths, workers, window=batch_size * 2):
+            if err is not None:
+                writer.write([{"path": path, "error": err}])
+                failed += 1
+                continue
+            batch.append((path, img))
+            if len(batch) == batch_size:
+                writer.write(score_batch(model, batch, nutrition, classes))
+                scored += len(batch)
+                batch = []
+        if batch:
+            writer.write(score_batch(model, batch, nutrition, classes))
+            scored += len(batch)
+    finally:
+        writer.close()
+    return scored, failed, len(done)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score a directory of food images.")
+    parser.add_argument("input_dir", nargs="?", default="dataset", help="Directory tree to scan")
+    parser.add_argument("-o", "--output", default="scores.jsonl", help="Output file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Override output format")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Decode threads")
+    parser.add_argument("--resume", action="store_true", help="Skip images already in the output file")
+    parser.add_argument("--model", default=food_model.MODEL_PATH)
+    parser.add_argument("--nutrition-db", default=NUTRITION_DB)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"not a directory: {args.input_dir}")
+
+    model = food_model.load_cnn_model(args.model)
+    if model is None:
+        print(f"⚠ Could not load {args.model}, using mock predictions", file=sys.stderr)
+
+    scored, failed, skipped = score_directory(
+        model, args.input_dir, args.output,
+        fmt=args.format, batch_size=args.batch_size, workers=args.workers, resume=args.resume,
+        nutrition=NutritionIndex(args.nutrition_db),
+        classes=food_model.load_classes(args.model),
+    )
+    print(f"✅ Scored {scored} images ({failed} failed, {skipped} skipped) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
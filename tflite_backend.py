@@ -0,0 +1,215 @@
+# ------------------------------
+# tflite_backend.py
+# Quantized TFLite export of the Keras model, and a small wrapper so the
+# rest of the app can run it like a Keras model.
+#
+#   python tflite_backend.py --mode int8       # export models/custom_food_model_int8.tflite
+#   FOOD_MODEL_BACKEND=tflite FOOD_TFLITE_THREADS=2 streamlit run app.py
+#
+# Uses ai-edge-litert / tflite_runtime when installed (no TensorFlow
+# import at all), else the interpreter bundled with TensorFlow.
+# ------------------------------
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from preprocessing import MODEL_INPUT_SIZE, load_for_model, to_model_input
+
+CALIBRATION_SAMPLES = 200
+QUANT_MODES = ("int8", "float16")
+
+def tflite_path(keras_path, mode):
+    return f"{os.path.splitext(keras_path)[0]}_{mode}.tflite"
+
+
+# ------------------------------
+# Inference
+# ------------------------------
+def _interpreter_class():
+    for module in ("ai_edge_litert.interpreter", "tflite_runtime.interpreter"):
+        try:
+            return __import__(module, fromlist=["Interpreter"]).Interpreter
+        except ImportError:
+            pass
+    from tensorflow.lite.python.interpreter import Interpreter
+    return Interpreter
+
+class TFLiteModel:
+    """predict_on_batch/predict over a TFLite interpreter.
+
+    Exports carry two outputs, pooled features and class probabilities, so
+    the embedding store works on this backend too.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        outputs = sorted(self.interpreter.get_output_details(), key=lambda d: d["shape"][-1])
+        # The class-probability output is the narrow one
+        self.probs_output = outputs[0]
+        self.features_output = outputs[-1] if len(outputs) > 1 else None
+        self.batch = int(self.input["shape"][0])
+        # One interpreter, one invocation at a time
+        self._lock = threading.Lock()
+
+    def _resize(self, n):
+        if n != self.batch:
+            self.interpreter.resize_tensor_input(self.input["index"], [n, *self.input["shape"][1:]])
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.batch = n
+
+    def _quantize(self, x):
+        scale, zero = self.input["quantization"]
+        if self.input["dtype"] == np.float32 or not scale:
+            return x.astype(self.input["dtype"], copy=False)
+        info = np.iinfo(self.input["dtype"])
+        return np.clip(np.round(x / scale + zero), info.min, info.max).astype(self.input["dtype"])
+
+    def _read(self, details):
+        out = self.interpreter.get_tensor(details["index"])
+        scale, zero = details["quantization"]
+        if out.dtype != np.float32 and scale:
+            out = (out.astype(np.float32) - zero) * scale
+        return np.array(out, dtype=np.float32)
+
+    def predict_with_features(self, x):
+        """(features, probabilities) for a preprocessed float32 batch."""
+        with self._lock:
+            self._resize(len(x))
+            self.interpreter.set_tensor(self.input["index"], self._quantize(np.asarray(x)))
+            self.interpreter.invoke()
+            probs = self._read(self.probs_output)
+            features = self._read(self.features_output) if self.features_output else None
+        return features, probs
+
+    def predict_on_batch(self, x):
+        return self.predict_with_features(x)[1]
+
+    def predict(self, x, batch_size=32, verbose=0):
+        return np.concatenate([self.predict_on_batch(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+# ------------------------------
+# Export
+# ------------------------------
+def calibration_batches(paths, size=MODEL_INPUT_SIZE):
+    # Representative inputs for int8 range calibration, one image per step
+    for path in paths:
+        yield [to_model_input([load_for_model(path, size)], size)]
+
+def sample_paths(dataset_dir, n=CALIBRATION_SAMPLES, seed=123):
+    """Up to ``n`` images spread evenly over the classes of ``dataset_dir``."""
+    from data_pipeline import list_class_files
+    _, files = list_class_files(dataset_dir)
+    rng = np.random.default_rng(seed)
+    per_class = max(1, n // max(1, len(files)))
+    picked = []
+    for paths in files.values():
+        picked += [paths[i] for i in sorted(rng.permutation(len(paths))[:per_class])]
+    return picked[:n]
+
+def export_tflite(model, out_path, mode="int8", calibration_paths=None, features_layer=-3):
+    """Write a quantized TFLite copy of the Keras ``model`` with
+    [pooled features, probabilities] outputs; returns the file size.
+    ``features_layer`` indexes the pooling layer (-2 for the cascade's tiny model)."""
+    import tensorflow as tf
+    from tensorflow.keras.models import Model
+
+    dual = Model(inputs=model.input, outputs=[model.layers[features_layer].output, model.output])
+    converter = tf.lite.TFLiteConverter.from_keras_model(dual)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 export needs calibration images")
+        size = tuple(int(d) for d in model.input.shape[1:3])[::-1]
+        converter.representative_dataset = lambda: calibration_batches(calibration_paths, size)
+        # Integer kernels throughout; float32 in/out keeps the preprocessing unchanged
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"unknown quantization mode: {mode}")
+
+    data = converter.convert()
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def compare(keras_model, tflite_model, samples, batch_size=32):
+    """Top-1 accuracy of both models on labeled ``samples`` [(path, class)],
+    their agreement, and per-image latency."""
+    paths = [p for p, _ in samples]
+    labels = np.array([l for _, l in samples])
+    keras_preds, tflite_preds = [], []
+    keras_s = tflite_s = 0.0
+    if paths:
+        # Keep graph building / tensor allocation out of the timings
+        x = to_model_input([load_for_model(paths[0])])
+        keras_model.predict_on_batch(x)
+        tflite_model.predict_on_batch(x)
+    for i in range(0, len(paths), batch_size):
+        x = to_model_input([load_for_model(p) for p in paths[i:i + batch_size]])
+        t0 = time.perf_counter()
+        keras_preds.append(np.argmax(keras_model.predict_on_batch(x), axis=1))
+        t1 = time.perf_counter()
+        tflite_preds.append(np.argmax(tflite_model.predict_on_batch(x), axis=1))
+        t2 = time.perf_counter()
+        keras_s += t1 - t0
+        tflite_s += t2 - t1
+    keras_preds, tflite_preds = np.concatenate(keras_preds), np.concatenate(tflite_preds)
+    n = max(1, len(paths))
+    return {
+        "images": len(paths),
+        "keras_accuracy": float(np.mean(keras_preds == labels)),
+        "tflite_accuracy": float(np.mean(tflite_preds == labels)),
+        "agreement": float(np.mean(keras_preds == tflite_preds)),
+        "keras_ms_per_image": keras_s / n * 1000,
+        "tflite_ms_per_image": tflite_s / n * 1000,
+    }
+
+def export_and_report(model, keras_path, dataset_dir, mode="int8", validation_split=0.2,
+                      calibration_samples=CALIBRATION_SAMPLES, num_threads=None):
+    """Export next to ``keras_path`` and print the accuracy delta on the
+    validation split (the whole dataset when there is no split)."""
+    from data_pipeline import list_class_files, split_files
+
+    out_path = tflite_path(keras_path, mode)
+    size = export_tflite(model, out_path, mode, sample_paths(dataset_dir, calibration_samples))
+    print(f"📦 Exported {mode} TFLite model: {out_path} ({size / 1e6:.1f} MB"
+          f" vs {os.path.getsize(keras_path) / 1e6:.1f} MB .h5)")
+
+    class_indices, files = list_class_files(dataset_dir)
+    train, val = split_files(class_indices, files, validation_split)
+    report = compare(model, TFLiteModel(out_path, num_threads), val or train)
+    print(f"🎯 Accuracy on {report['images']} images: Keras {report['keras_accuracy']:.1%}, "
+          f"TFLite {report['tflite_accuracy']:.1%} "
+          f"(delta {report['tflite_accuracy'] - report['keras_accuracy']:+.1%}, "
+          f"agreement {report['agreement']:.1%})")
+    print(f"⏱ {report['keras_ms_per_image']:.1f} ms/image Keras, {report['tflite_ms_per_image']:.1f} ms/image TFLite")
+    return out_path, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a quantized TFLite copy of the Keras model.")
+    parser.add_argument("--model", default="models/custom_food_model.h5")
+    parser.add_argument("--dataset", default="dataset", help="Calibration/evaluation images")
+    parser.add_argument("--mode", choices=QUANT_MODES, default="int8")
+    parser.add_argument("--calibration-samples", type=int, default=CALIBRATION_SAMPLES)
+    parser.add_argument("--threads", type=int, help="Interpreter threads for the comparison")
+    args = parser.parse_args(argv)
+
+    from tensorflow.keras.models import load_model
+    export_and_report(load_model(args.model), args.model, args.dataset, args.mode,
+                      calibration_samples=args.calibration_samples, num_threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,15 @@
 # 1️⃣ Imports
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Input
+from data_pipeline import build_dataset, list_class_files, make_datasets, split_files
+from feature_cache import FeatureCache, FEATURE_CACHE_DIR
+from tflite_backend import QUANT_MODES, CALIBRATION_SAMPLES, export_and_report, export_tflite, sample_paths, tflite_path
+from cascade import (FEATURES_LAYER, TARGET_ACCURACY, TINY_IMG_SIZE, TINY_MODEL_PATH, build_tiny_model,
+                     calibrate_threshold, save_tiny_model, calibration_path)
+from model_registry import TINY_FILE, classes_from_indices, publish_version, write_labels
+import numpy as np
+import argparse
 import os
 
 # ------------------------------
@@ -16,46 +23,57 @@ dataset_dir = "dataset"   # Folder that contains 'apple/' and 'burger/'
 img_size = (224, 224)
 batch_size = 8
 epochs = 10
+cache_dir = None          # None = cache decoded images in memory, or a folder for a disk cache
+validation_split = 0.2
+
+parser = argparse.ArgumentParser(description="Train the food classifier.")
+parser.add_argument("--head-only", action="store_true",
+                    help="Train only the Dense head on cached backbone features")
+parser.add_argument("--tflite", choices=QUANT_MODES,
+                    help="Also export a quantized TFLite model, calibrated on dataset images")
+parser.add_argument("--calibration-samples", type=int, default=CALIBRATION_SAMPLES)
+parser.add_argument("--cascade", action="store_true",
+                    help="Also train the tiny 96px first-tier model and calibrate its threshold")
+parser.add_argument("--cascade-target", type=float, default=TARGET_ACCURACY,
+                    help="Accuracy the tiny model must keep on the images it answers")
+args = parser.parse_args()
 
 # ------------------------------
-# 3️⃣ Data Generators (split + normalization)
+# 3️⃣ Input Pipeline (split + normalization)
 # ------------------------------
-train_datagen = ImageDataGenerator(rescale=1./255, validation_split=0.2)
-
-train_generator = train_datagen.flow_from_directory(
-    dataset_dir,
-    target_size=img_size,
-    batch_size=batch_size,
-    class_mode="categorical",
-    subset="training"
-)
-
-val_generator = train_datagen.flow_from_directory(
-    dataset_dir,
-    target_size=img_size,
-    batch_size=batch_size,
-    class_mode="categorical",
-    subset="validation"
-)
+# Parallel decode/resize, cached after the first epoch, prefetched.
+# Same per-class 80/20 split as ImageDataGenerator(validation_split=0.2).
+if args.head_only:
+    class_indices, class_files = list_class_files(dataset_dir)
+    train_samples, val_samples = split_files(class_indices, class_files, validation_split)
+else:
+    train_ds, val_ds, class_indices = make_datasets(
+        dataset_dir,
+        img_size=img_size,
+        batch_size=batch_size,
+        validation_split=validation_split,
+        cache_dir=cache_dir
+    )
 
 # Automatically detect number of classes
-num_classes = len(train_generator.class_indices)
-print(f"✅ Detected {num_classes} classes: {train_generator.class_indices}")
+num_classes = len(class_indices)
+class_names = classes_from_indices(class_indices)
+print(f"✅ Detected {num_classes} classes: {class_indices}")
 
 # ------------------------------
 # 4️⃣ Build Model (MobileNetV2 Base)
 # ------------------------------
-base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=(224,224,3))
+base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=img_size + (3,))
 
 # Freeze base layers
 for layer in base_model.layers:
     layer.trainable = False
 
-# Add custom layers
-x = base_model.output
-x = GlobalAveragePooling2D()(x)
-x = Dense(128, activation="relu")(x)
-predictions = Dense(num_classes, activation="softmax")(x)
+# Add custom layers (kept as objects so --head-only can train them directly)
+pooled = GlobalAveragePooling2D()(base_model.output)
+hidden = Dense(128, activation="relu")
+classifier = Dense(num_classes, activation="softmax")
+predictions = classifier(hidden(pooled))
 
 model = Model(inputs=base_model.input, outputs=predictions)
 
@@ -67,16 +85,117 @@ model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accur
 # ------------------------------
 # 6️⃣ Train Model
 # ------------------------------
-model.fit(
-    train_generator,
-    validation_data=val_generator,
-    epochs=epochs
-)
+if args.head_only:
+    # Bottleneck features are computed once per image (new/changed files only)
+    # and the head trains on them directly, skipping the backbone every epoch.
+    feature_extractor = Model(inputs=base_model.input, outputs=pooled)
+    feature_cache = FeatureCache(
+        os.path.join(FEATURE_CACHE_DIR, f"{img_size[0]}x{img_size[1]}"),
+        dim=int(pooled.shape[-1])
+    )
+
+    def extract_features(paths):
+        ds = build_dataset([(p, 0) for p in paths], num_classes, img_size, 32, training=False, cache=None)
+        return feature_extractor.predict(ds, verbose=0)
+
+    def cached_features(samples):
+        feats, extracted = feature_cache.features_for([p for p, _ in samples], extract_features)
+        labels = np.eye(num_classes, dtype=np.float32)[[l for _, l in samples]]
+        return feats, labels, extracted
+
+    train_x, train_y, n_train = cached_features(train_samples)
+    val_x, val_y, n_val = cached_features(val_samples) if val_samples else (None, None, 0)
+    total = len(train_samples) + len(val_samples)
+    print(f"🧠 Features: {n_train + n_val} extracted, {total - n_train - n_val} from cache")
+
+    # hidden/classifier are shared with `model`, so training this head
+    # trains the head of the full model in place
+    feature_input = Input(shape=(train_x.shape[1],))
+    head = Model(inputs=feature_input, outputs=classifier(hidden(feature_input)))
+    head.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    head.fit(
+        train_x, train_y,
+        validation_data=(val_x, val_y) if val_samples else None,
+        batch_size=max(batch_size, 32),
+        epochs=epochs,
+        shuffle=True
+    )
+else:
+    model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=epochs
+    )
 
 # ------------------------------
 # 7️⃣ Save Model
 # ------------------------------
 os.makedirs("models", exist_ok=True)
 model.save("models/custom_food_model.h5")
+# Output order -> dish name, read by food_model.load_classes
+write_labels("models", class_names, img_size=list(img_size))
+version_files = {"model.h5": "models/custom_food_model.h5"}
 
 print("\n🎉 Training complete! Model saved as 'models/custom_food_model.h5'")
+
+# ------------------------------
+# 8️⃣ Quantized TFLite Export (optional)
+# ------------------------------
+if args.tflite:
+    tflite_file, _ = export_and_report(
+        model, "models/custom_food_model.h5", dataset_dir,
+        mode=args.tflite,
+        validation_split=validation_split,
+        calibration_samples=args.calibration_samples
+    )
+    version_files[f"model_{args.tflite}.tflite"] = tflite_file
+
+# ------------------------------
+# 9️⃣ Tiny Cascade Model (optional)
+# ------------------------------
+if args.cascade:
+    tiny_train_ds, tiny_val_ds, _ = make_datasets(
+        dataset_dir,
+        img_size=TINY_IMG_SIZE,
+        batch_size=max(batch_size, 32),
+        validation_split=validation_split,
+        cache_dir=cache_dir
+    )
+    tiny_model = build_tiny_model(num_classes)
+    tiny_model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    tiny_model.fit(tiny_train_ds, validation_data=tiny_val_ds, epochs=epochs)
+
+    # Threshold from held-out images: the tiny model keeps a prediction only
+    # where it is as reliable as --cascade-target
+    calib_ds = tiny_val_ds
+    if calib_ds is None:
+        # No validation split: the training images, unshuffled, so the
+        # predictions and the label pass below see the same order
+        _, calib_files = list_class_files(dataset_dir)
+        calib_samples, _ = split_files(class_indices, calib_files, validation_split)
+        calib_ds = build_dataset(calib_samples, num_classes, TINY_IMG_SIZE, max(batch_size, 32),
+                                 training=False, cache=None)
+    calib_probs = tiny_model.predict(calib_ds, verbose=0)
+    calib_labels = np.concatenate([np.argmax(y, axis=1) for _, y in calib_ds])
+    threshold, accept_rate, kept_accuracy = calibrate_threshold(calib_probs, calib_labels, args.cascade_target)
+    save_tiny_model(tiny_model, threshold, TINY_MODEL_PATH,
+                    accept_rate=accept_rate, accepted_accuracy=kept_accuracy, target_accuracy=args.cascade_target)
+    print(f"🔀 Tiny model saved as '{TINY_MODEL_PATH}': threshold {threshold:.3f}, "
+          f"answers {accept_rate:.0%} of held-out images at {kept_accuracy:.1%} accuracy")
+    version_files[TINY_FILE] = TINY_MODEL_PATH
+    version_files[os.path.basename(calibration_path(TINY_FILE))] = calibration_path(TINY_MODEL_PATH)
+
+    if args.tflite:
+        # The TFLite backend runs the tiny tier from this export too
+        tiny_tflite = tflite_path(TINY_MODEL_PATH, args.tflite)
+        size = export_tflite(tiny_model, tiny_tflite, args.tflite,
+                             sample_paths(dataset_dir, args.calibration_samples), features_layer=FEATURES_LAYER)
+        print(f"📦 Exported {args.tflite} TFLite tiny model: {tiny_tflite} ({size / 1e6:.1f} MB)")
+        version_files[tflite_path(TINY_FILE, args.tflite)] = tiny_tflite
+
+# ------------------------------
+# 🔟 Publish Model Version
+# ------------------------------
+# A running app picks this up, warms it up and swaps it in without a restart
+version_dir = publish_version(version_files, class_names, img_size=list(img_size))
+print(f"🚀 Published model version: {version_dir}")
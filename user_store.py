@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+# -------------------------------------------------
+# CONFIG
+# -------------------------------------------------
+USER_DB = "users.json"
+
+def email_key(email):
+    return str(email or "").strip().casefold()
+
+# -------------------------------------------------
+# USER STORE
+# -------------------------------------------------
+class UserStore:
+    """users.json with an in-memory case-folded email index.
+
+    The file is only re-parsed when its mtime/size changes. Writes take an
+    exclusive lock on ``<path>.lock``, re-read the file, apply the change and
+    atomically replace the file, so concurrent signups cannot clobber each
+    other.
+    """
+
+    def __init__(self, path=USER_DB):
+        self.path = path
+        self._lock = threading.RLock()
+        self._users = []
+        self._by_email = {}
+        self._signature = None
+        if not os.path.exists(path):
+            self._write([])
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load(self):
+        sig = self._file_signature()
+        try:
+            with open(self.path, "r") as f:
+                users = json.load(f)
+        except (OSError, ValueError):
+            users = []
+        self._users = users
+        self._by_email = {email_key(u.get("email")): u for u in users}
+        self._signature = sig
+
+    def _refresh(self):
+        if self._file_signature() != self._signature:
+            self._load()
+
+    def _write(self, users):
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".users-", suffix=".tmp", dir=dirname)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(users, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _modify(self, fn):
+        with self._exclusive():
+            # Always start from what is on disk, another process may have written
+            self._load()
+            changed = fn(self._users, self._by_email)
+            if changed:
+                self._write(self._users)
+                self._signature = self._file_signature()
+            return changed
+
+    # ---------------- public API ----------------
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return [dict(u) for u in self._users]
+
+    def find(self, email):
+        with self._lock:
+            self._refresh()
+            user = self._by_email.get(email_key(email))
+            return dict(user) if user else None
+
+    def add(self, user):
+        def op(users, by_email):
+            key = email_key(user["email"])
+            if key in by_email:
+                return False
+            users.append(user)
+            by_email[key] = user
+            return True
+        return self._modify(op)
+
+    def update(self, email, **fields):
+        def op(users, by_email):
+            user = by_email.get(email_key(email))
+            if user is None:
+                return False
+            user.update(fields)
+            return True
+        return self._modify(op)